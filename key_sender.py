@@ -0,0 +1,214 @@
+"""
+按键发送 - 在 Windows 上通过 SendInput 直接发送扫描码，一次系统调用可以发送一组按键事件，
+不经过 keyboard 库的按键解析和钩子处理。
+"""
+
+import ctypes
+import threading
+from ctypes import wintypes
+
+INPUT_KEYBOARD = 1
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_SCANCODE = 0x0008
+MAPVK_VK_TO_VSC = 0
+
+# 预先分配的 INPUT 数量，超过时才临时分配
+INPUT_POOL_SIZE = 32
+
+# 修饰键的虚拟键码，字母键的虚拟键码就是大写字母的编码
+MODIFIER_VK_CODES = {
+    'shift': 0x10,
+    'ctrl': 0x11,
+    'alt': 0x12,
+}
+
+ULONG_PTR = ctypes.c_size_t
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [
+        ('wVk', wintypes.WORD),
+        ('wScan', wintypes.WORD),
+        ('dwFlags', wintypes.DWORD),
+        ('time', wintypes.DWORD),
+        ('dwExtraInfo', ULONG_PTR),
+    ]
+
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [
+        ('dx', wintypes.LONG),
+        ('dy', wintypes.LONG),
+        ('mouseData', wintypes.DWORD),
+        ('dwFlags', wintypes.DWORD),
+        ('time', wintypes.DWORD),
+        ('dwExtraInfo', ULONG_PTR),
+    ]
+
+class _INPUTUNION(ctypes.Union):
+    # 包含 MOUSEINPUT 使结构体大小与系统定义的 INPUT 一致
+    _fields_ = [('ki', KEYBDINPUT), ('mi', MOUSEINPUT)]
+
+class INPUT(ctypes.Structure):
+    _fields_ = [('type', wintypes.DWORD), ('union', _INPUTUNION)]
+
+def get_vk_code(name):
+    """按键名称转换为虚拟键码，不支持的按键返回 None"""
+    if name in MODIFIER_VK_CODES:
+        return MODIFIER_VK_CODES[name]
+    if len(name) == 1 and name.isalnum():
+        return ord(name.upper())
+    return None
+
+def create_key_sender():
+    """创建按键发送器，不是 Windows 或无法加载 user32 时返回 None（改用 keyboard 库）"""
+    try:
+        user32 = ctypes.windll.user32
+    except (AttributeError, OSError):
+        return None
+    try:
+        return KeySender(user32)
+    except Exception as e:
+        print(f"初始化按键发送器失败: {str(e)}")
+        return None
+
+class KeySender:
+    def __init__(self, user32):
+        self._user32 = user32
+        self._scancodes = {}  # 按键名称 -> 扫描码
+        self._pending = []  # 等待一次性发送的 (扫描码, 标志)
+        # prepare 时为每个按键预先算好的按下/松开事件，加入队列时直接复制
+        self._down_events = {}
+        self._up_events = {}
+        # prepare 时为每个按键预先填好的按下/松开 INPUT 数组，单独点按时直接发送
+        self._down_inputs = {}
+        self._up_inputs = {}
+        # prepare 时为每个按键预先填好的完整点按（按下后立即松开）INPUT 数组
+        self._tap_inputs = {}
+        # 复用的 INPUT 数组，发送时只改写前几项的扫描码和标志
+        self._input_pool = (INPUT * INPUT_POOL_SIZE)()
+        for item in self._input_pool:
+            item.type = INPUT_KEYBOARD
+        self._input_size = ctypes.sizeof(INPUT)
+        self._input_lock = threading.Lock()  # 停止播放时界面线程也会发送按键，避免同时改写数组
+        self._failed_events = 0  # 被系统拒绝（如被更高权限窗口拦截）的事件数，由调用方在播放结束时取出报告
+
+    def _get_scancode(self, name):
+        """获取按键的扫描码（缓存），不支持的按键抛出 ValueError"""
+        scancode = self._scancodes.get(name)
+        if scancode is None:
+            vk = get_vk_code(name)
+            scancode = self._user32.MapVirtualKeyW(vk, MAPVK_VK_TO_VSC) if vk is not None else 0
+            if not scancode:
+                raise ValueError(f"不支持的按键: {name}")
+            self._scancodes[name] = scancode
+        return scancode
+
+    def prepare(self, keys):
+        """预先计算一组按键（如 'shift+q'）用到的扫描码，并填好按下/松开/点按用的 INPUT 数组"""
+        for key in keys:
+            self._down_events[key] = self._key_events(key, True)
+            self._up_events[key] = self._key_events(key, False)
+            self._down_inputs[key] = self._build_inputs(self._down_events[key])
+            self._up_inputs[key] = self._build_inputs(self._up_events[key])
+            self._tap_inputs[key] = self._build_inputs(self._down_events[key] + self._up_events[key])
+
+    def _build_inputs(self, events):
+        """把 (扫描码, 标志) 列表填成 INPUT 数组"""
+        inputs = (INPUT * len(events))()
+        for item, (scancode, flags) in zip(inputs, events):
+            item.type = INPUT_KEYBOARD
+            item.union.ki.wScan = scancode
+            item.union.ki.dwFlags = flags
+        return inputs
+
+    def _key_events(self, key, is_press):
+        """组合键按下时先按修饰键，松开时先松开基础键"""
+        names = key.split('+')
+        if is_press:
+            return [(self._get_scancode(name), KEYEVENTF_SCANCODE) for name in names]
+        return [(self._get_scancode(name), KEYEVENTF_SCANCODE | KEYEVENTF_KEYUP)
+                for name in reversed(names)]
+
+    def queue(self, key, is_press):
+        """把按键事件加入待发送队列，调用 flush 时一起发送（同一和弦的按键在一次 SendInput 中发出）"""
+        events = (self._down_events if is_press else self._up_events).get(key)
+        if events is None:
+            events = self._key_events(key, is_press)
+        self._pending.extend(events)
+
+    def flush(self):
+        """一次 SendInput 调用发送队列中的全部按键事件"""
+        if not self._pending:
+            return
+        events, self._pending = self._pending, []
+        self._send(events)
+
+    def press(self, *keys):
+        """立即按下一个或多个按键（一次 SendInput 调用）"""
+        if len(keys) == 1 and keys[0] in self._down_inputs:
+            self._send_inputs(self._down_inputs[keys[0]])
+            return
+        events = []
+        for key in keys:
+            events.extend(self._key_events(key, True))
+        self._send(events)
+
+    def release(self, *keys):
+        """立即松开一个或多个按键（一次 SendInput 调用）"""
+        if len(keys) == 1 and keys[0] in self._up_inputs:
+            self._send_inputs(self._up_inputs[keys[0]])
+            return
+        events = []
+        for key in keys:
+            events.extend(self._key_events(key, False))
+        self._send(events)
+
+    def tap(self, key):
+        """点按一个按键：按下和松开的全部事件在一次 SendInput 调用中发出，
+        组合键依次为 修饰键按下、基础键按下、基础键松开、修饰键松开"""
+        inputs = self._tap_inputs.get(key)
+        if inputs is None:
+            self._send(self._key_events(key, True) + self._key_events(key, False))
+            return
+        self._send_inputs(inputs)
+
+    def release_and_tap(self, release_keys, tap_keys):
+        """一次 SendInput 调用先松开 release_keys，再依次点按 tap_keys（每个组合键的修饰键在下一个键之前已松开）"""
+        events = []
+        for key in release_keys:
+            up = self._up_events.get(key)
+            events.extend(up if up is not None else self._key_events(key, False))
+        for key in tap_keys:
+            down = self._down_events.get(key)
+            up = self._up_events.get(key)
+            events.extend(down if down is not None else self._key_events(key, True))
+            events.extend(up if up is not None else self._key_events(key, False))
+        if events:
+            self._send(events)
+
+    def _send(self, events):
+        count = len(events)
+        with self._input_lock:
+            if count <= INPUT_POOL_SIZE:
+                inputs = self._input_pool
+            else:
+                inputs = (INPUT * count)()
+                for item in inputs:
+                    item.type = INPUT_KEYBOARD
+            for i in range(count):
+                ki = inputs[i].union.ki
+                ki.wScan, ki.dwFlags = events[i]
+            self._send_inputs(inputs, count)
+
+    def _send_inputs(self, inputs, count=None):
+        """发送 INPUT 数组中的前 count 项（默认全部）"""
+        if count is None:
+            count = len(inputs)
+        sent = self._user32.SendInput(count, ctypes.byref(inputs), self._input_size)
+        if sent != count:
+            # 只计数，不在播放线程中打印
+            self._failed_events += count - sent
+
+    def take_failed_count(self):
+        """返回上次调用以来发送失败的事件数，并清零"""
+        failed, self._failed_events = self._failed_events, 0
+        return failed
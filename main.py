@@ -7,27 +7,94 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+import io
 import json
 import keyboard
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                            QHBoxLayout, QPushButton, QLabel, QFileDialog,
-                           QListWidget, QStyleFactory, QLineEdit, QCheckBox)
-from PyQt5.QtCore import Qt, QTimer, QMetaObject, Q_ARG, pyqtSlot, QThread
+                           QListWidget, QListView, QStyleFactory, QLineEdit, QCheckBox)
+from PyQt5.QtCore import (Qt, QTimer, QMetaObject, Q_ARG, pyqtSlot, pyqtSignal, QThread,
+                          QObject, QRunnable, QThreadPool, QAbstractListModel,
+                          QModelIndex, QSortFilterProxyModel, QElapsedTimer)
 from PyQt5.QtGui import QIcon
-from midi_player import MidiPlayer
+from midi_player import MidiPlayer, load_midi_file
+from midi_scanner import scan_tracks
 from keyboard_mapping import CONTROL_KEYS
+from preview_synth import create_synth_preview
 import mido
 import time
 import pygame.mixer
 import threading
 
-# 忽略废弃警告
-import warnings
-warnings.filterwarnings("ignore", category=DeprecationWarning)
-
 # 在主程序中添加或更新版本号
 VERSION = "1.0.3"
 
+# 识别为MIDI文件的扩展名
+MIDI_EXTENSIONS = {'.mid', '.midi'}
+
+# 预览时需要保留的消息类型
+NOTE_MESSAGE_TYPES = ('note_on', 'note_off')
+CONTROL_MESSAGE_TYPES = ('set_tempo', 'time_signature')
+
+# 歌曲列表每次向视图提供的行数（滚动到底部时再取下一批）
+SONG_FETCH_BATCH = 500
+
+# 扫描目录时每找到多少首歌曲就送到界面显示一次
+SCAN_BATCH_SIZE = 200
+
+# 最多缓存多少首歌曲的音轨分析结果
+TRACK_CACHE_SIZE = 32
+
+# 播放按钮在各状态下的样式
+PLAY_BUTTON_PLAYING_STYLE = """
+    QPushButton {
+        background-color: #f0ad4e;
+        color: white;
+        border: 1px solid #eea236;
+    }
+    QPushButton:hover {
+        background-color: #ec971f;
+        border-color: #d58512;
+    }
+"""
+PLAY_BUTTON_PAUSED_STYLE = """
+    QPushButton {
+        background-color: #5bc0de;
+        color: white;
+        border: 1px solid #46b8da;
+    }
+    QPushButton:hover {
+        background-color: #31b0d5;
+        border-color: #269abc;
+    }
+"""
+PLAY_BUTTON_READY_STYLE = """
+    QPushButton {
+        background-color: #5cb85c;
+        color: white;
+        border: 1px solid #4cae4c;
+    }
+    QPushButton:hover {
+        background-color: #449d44;
+        border-color: #398439;
+    }
+"""
+PLAY_BUTTON_STOPPED_STYLE = PLAY_BUTTON_READY_STYLE + """
+    QPushButton:disabled {
+        background-color: #f0f0f0;
+        color: #888;
+        border: 1px solid #ccc;
+    }
+"""
+
+# 延迟导入 orjson（可选，缺少时使用标准库 json）
+def get_orjson():
+    try:
+        import orjson
+        return orjson
+    except ImportError:
+        return None
+
 class Config:
     def __init__(self, filename="config.json"):
         self.filename = filename
@@ -44,8 +111,14 @@ class Config:
     
     def save(self, data):
         try:
-            with open(self.filename, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            orjson = get_orjson()
+            if orjson is not None:
+                content = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+            else:
+                content = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+            # 一次性写入整个文件
+            with open(self.filename, 'wb') as f:
+                f.write(content)
         except Exception as e:
             print(f"保存配置文件失败: {str(e)}")
     
@@ -56,6 +129,220 @@ class Config:
             'stay_on_top': False
         }
 
+class PreviewTrack(mido.MidiTrack):
+    """预览用的音符轨道视图：迭代时才筛选并移调原音轨的音符消息，不预先复制整条音轨"""
+
+    def __init__(self, source, note_offset):
+        super().__init__()
+        self.source = source
+        self.note_offset = note_offset
+
+    def __iter__(self):
+        note_offset = self.note_offset
+        for msg in self.source:
+            if msg.type in NOTE_MESSAGE_TYPES:
+                adjusted_note = msg.note + note_offset
+                if 36 <= adjusted_note <= 96:
+                    # 无需移调时直接引用原消息
+                    yield msg.copy(note=adjusted_note) if note_offset else msg
+
+    def has_notes(self):
+        """是否至少包含一个可播放的音符"""
+        return next(iter(self), None) is not None
+
+def note_histogram_stats(hist, note_offset):
+    """根据128格音符直方图一次性得出 (最低音, 最高音, 音符总数, 可播放音符数)"""
+    min_note = next(note for note in range(128) if hist[note])
+    max_note = next(note for note in range(127, -1, -1) if hist[note])
+    # 偏移后落在 36-96 之间的原始音符区间
+    playable_notes = sum(hist[max(0, 36 - note_offset):max(0, 97 - note_offset)])
+    return min_note, max_note, sum(hist), playable_notes
+
+def iter_midi_files(dir_path):
+    """递归遍历目录下的MIDI文件，顺序与 os.walk 一致"""
+    stack = [dir_path]
+    while stack:
+        current_dir = stack.pop()
+        sub_dirs = []
+        try:
+            with os.scandir(current_dir) as entries:
+                for entry in entries:
+                    # DirEntry 自带文件类型缓存，无需额外的 stat 调用
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            sub_dirs.append(entry.path)
+                        continue
+                    name = entry.name
+                    dot = name.rfind('.')
+                    if dot >= 0 and name[dot:].lower() in MIDI_EXTENSIONS:
+                        yield entry.path
+        except OSError:
+            continue
+        stack.extend(reversed(sub_dirs))
+
+def format_track_row(title, hist, velocity_sum, note_offset):
+    """生成一个音轨列表项的文本，title 中的 {total} 替换为音符总数"""
+    min_note, max_note, total_notes, playable_notes = note_histogram_stats(hist, note_offset)
+    return (
+        f"{title.format(total=total_notes)}\n"
+        f"├ 音符范围: {min_note}-{max_note} → "
+        f"{min_note + note_offset}-{max_note + note_offset}\n"
+        f"├ 可播放: {playable_notes}/{total_notes} ({playable_notes/total_notes*100:.1f}%)\n"
+        f"└ 平均力度: {velocity_sum / total_notes:.1f}"
+    )
+
+def build_track_rows(track_stats, note_offset):
+    """根据 scan_tracks 的统计结果生成音轨列表中显示的文本"""
+    # 只处理包含音符的音轨
+    note_tracks = [(i, stats) for i, stats in enumerate(track_stats) if stats['velocity_sum']]
+    if not note_tracks:
+        return []
+    
+    # 全部音轨选项：合并各音轨的直方图和力度总和
+    all_hist = [sum(counts) for counts in zip(*(stats['hist'] for _, stats in note_tracks))]
+    all_velocity_sum = sum(stats['velocity_sum'] for _, stats in note_tracks)
+    return [format_track_row("◆ 全部音轨 [音符总数: {total}]", all_hist, all_velocity_sum, note_offset)] + [
+        format_track_row(f"◇ 音轨 {i} [音符数: {{total}}, 通道: {stats['channel']}]",
+                         stats['hist'], stats['velocity_sum'], note_offset)
+        for i, stats in note_tracks
+    ]
+
+class SongListModel(QAbstractListModel):
+    """歌曲列表模型：显示文件名，Qt.UserRole 返回文件完整路径
+
+    行按需分批提供给视图（fetchMore），大目录下不会一次创建全部行。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.paths = []
+        self.names = []
+        self._loaded = 0  # 已提供给视图的行数
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded < len(self.paths)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        self.fetch_until(self._loaded + SONG_FETCH_BATCH - 1)
+
+    def fetch_until(self, row):
+        """确保第 row 行（含）之前的歌曲都已提供给视图"""
+        end = min(row + 1, len(self.paths))
+        if end <= self._loaded:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, end - 1)
+        self._loaded = end
+        self.endInsertRows()
+
+    def fetch_all(self):
+        """提供全部歌曲（搜索时需要全部参与过滤）"""
+        self.fetch_until(len(self.paths) - 1)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return self.names[index.row()]
+        if role == Qt.UserRole:
+            return self.paths[index.row()]
+        return None
+
+    def set_files(self, paths):
+        """替换全部歌曲"""
+        self.beginResetModel()
+        self.paths = paths
+        self.names = [os.path.basename(path) for path in paths]
+        self._loaded = min(len(paths), SONG_FETCH_BATCH)
+        self.endResetModel()
+
+    def append_files(self, paths):
+        """追加歌曲（扫描目录时分批调用）"""
+        self.paths.extend(paths)
+        self.names.extend(os.path.basename(path) for path in paths)
+        # 第一批的歌曲直接显示，其余的等视图滚动到底部时再提供
+        if self._loaded < SONG_FETCH_BATCH:
+            self.fetch_until(SONG_FETCH_BATCH - 1)
+
+    def remove_file(self, path):
+        """按路径移除歌曲，返回原来的行号"""
+        row = self.paths.index(path)
+        if row >= self._loaded:
+            # 视图中还没有这一行，直接删除即可
+            del self.paths[row]
+            del self.names[row]
+            return row
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.paths[row]
+        del self.names[row]
+        self._loaded -= 1
+        self.endRemoveRows()
+        return row
+
+class TrackAnalysisSignals(QObject):
+    """音轨分析任务的信号，跨线程发出时由Qt排队到界面线程执行"""
+    finished = pyqtSignal(str, object, object)  # 文件路径, 音轨信息, 音轨列表文本
+    failed = pyqtSignal(str, str)  # 文件路径, 错误信息
+
+class TrackAnalysisTask(QRunnable):
+    """在线程池中扫描MIDI文件并统计音轨，避免阻塞界面"""
+
+    def __init__(self, path, note_offset):
+        super().__init__()
+        self.path = path
+        self.note_offset = note_offset
+        self.signals = TrackAnalysisSignals()
+
+    def run(self):
+        try:
+            track_stats = scan_tracks(self.path)
+        except (EOFError, OSError, ValueError) as e:
+            self.signals.failed.emit(self.path, str(e))
+            return
+
+        # 与 analyze_tracks 的结果一一对应：每条含有音符消息的音轨一项
+        tracks_info = [{'channel': None, 'notes_count': sum(stats['hist'])}
+                       for stats in track_stats if stats['has_notes']]
+        try:
+            items = build_track_rows(track_stats, self.note_offset)
+        except Exception as e:
+            print(f"更新音轨列表时出错: {str(e)}")
+            # 出错时只保留全部音轨选项
+            items = ["◆ 全部音轨"]
+        self.signals.finished.emit(self.path, tracks_info, items)
+
+class DirectoryScanSignals(QObject):
+    """目录扫描任务的信号"""
+    batch_ready = pyqtSignal(int, list)  # 扫描编号, 本批文件路径
+    finished = pyqtSignal(int)  # 扫描编号
+
+class DirectoryScanTask(QRunnable):
+    """在线程池中扫描目录，边扫描边把找到的MIDI文件分批送回界面线程"""
+
+    def __init__(self, dir_path, generation, cancel_event):
+        super().__init__()
+        self.dir_path = dir_path
+        self.generation = generation
+        self.cancel_event = cancel_event
+        self.signals = DirectoryScanSignals()
+
+    def run(self):
+        batch = []
+        for path in iter_midi_files(self.dir_path):
+            if self.cancel_event.is_set():
+                return
+            batch.append(path)
+            if len(batch) >= SCAN_BATCH_SIZE:
+                self.signals.batch_ready.emit(self.generation, batch)
+                batch = []
+        if batch and not self.cancel_event.is_set():
+            self.signals.batch_ready.emit(self.generation, batch)
+        self.signals.finished.emit(self.generation)
+
 def handle_error(func_name):
     def decorator(func):
         def wrapper(*args, **kwargs):
@@ -86,10 +373,16 @@ class MainWindow(QMainWindow):
         # 从配置管理器获取配置
         self.config = self.config_manager.data
         self.last_directory = self.config.get('last_directory', '')
+        # 配置修改后延迟写入，避免频繁写文件
+        self._config_dirty = False
+        self._config_timer = QTimer(self)
+        self._config_timer.setSingleShot(True)
+        self._config_timer.setInterval(5000)
+        self._config_timer.timeout.connect(self._flush_config)
         
         # 添加键盘事件防抖动
-        self.last_key_time = 0
-        self.key_cooldown = 0.2  # 200ms冷却时间
+        self._key_timer = QElapsedTimer()  # 距上次处理按键的时间（尚未按键时无效）
+        self._key_cooldown_ms = 200  # 200ms冷却时间
         
         # 设置基础样式
         self.setStyleSheet("""
@@ -113,7 +406,7 @@ class MainWindow(QMainWindow):
                 background-color: #d4d4d4;
                 border-color: #8c8c8c;
             }
-            QListWidget {
+            QListView {
                 background-color: #ffffff;
                 border: 1px solid #cccccc;
                 border-radius: 4px;
@@ -130,10 +423,26 @@ class MainWindow(QMainWindow):
             QCheckBox {
                 font-size: 14px;
             }
+            QPushButton#previewBtn:disabled {
+                background-color: #f0f0f0;
+                color: #888;
+                border: 1px solid #ccc;
+            }
+            QPushButton#previewBtn[previewing="true"] {
+                background-color: #d9534f;
+                color: white;
+                border: 1px solid #d43f3a;
+            }
+            QPushButton#previewBtn[previewing="true"]:hover {
+                background-color: #c9302c;
+                border-color: #ac2925;
+            }
         """)
         
         # 初始化预览状态
         self.is_previewing = False
+        self._preview_mid = None  # 首次预览时创建，之后复用
+        self._preview_control_track = None
         
         # 初始化pygame mixer（如果还没有初始化）
         if not pygame.mixer.get_init():
@@ -142,9 +451,20 @@ class MainWindow(QMainWindow):
             except Exception as e:
                 print(f"初始化音频系统失败: {str(e)}")
         
+        # 可用时直接用 fluidsynth 合成预览，否则使用 pygame 播放临时文件
+        self.synth_preview = create_synth_preview()
+        
         # 初始化其他属性
         self.current_index = -1
         self.midi_files = []
+        self._basenames = []  # 与 midi_files 一一对应的文件名
+        self._analysis_path = None  # 正在等待分析结果的文件
+        # 目录扫描：编号用于丢弃旧扫描送来的结果
+        self._scan_generation = 0
+        self._scan_cancel = threading.Event()
+        self._analysis_key = None
+        # 音轨分析结果缓存: (路径, 修改时间, 音符偏移) -> (音轨信息, 音轨列表文本)
+        self._track_cache = {}
         self.midi_player = MidiPlayer()
         # 连接窗口切换失败信号
         self.midi_player.window_switch_failed.connect(self.handle_window_switch_failed)
@@ -153,6 +473,17 @@ class MainWindow(QMainWindow):
         self.progress_timer = QTimer(self)
         self.progress_timer.timeout.connect(self.update_progress)
         self.progress_timer.setInterval(100)  # 每100ms更新一次
+        self._last_remaining_sec = -1  # 倒计时标签上显示的剩余秒数
+        
+        # 搜索防抖：停止输入一段时间后才过滤歌曲列表
+        self._pending_filter = ""
+        self._filter_timer = QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(250)
+        self._filter_timer.timeout.connect(lambda: self.filter_songs(self._pending_filter))
+        
+        # 播放按钮当前的 (文字, 样式)
+        self._play_button_state = None
         
         # 预览按钮
         self.preview_button = QPushButton("预览")
@@ -169,11 +500,11 @@ class MainWindow(QMainWindow):
         
         # 应用保存的置顶状态
         stay_on_top = self.config.get('stay_on_top', True)  # 默认为True
+        # 窗口标志在下面直接设置，恢复复选框状态时不触发切换（也不会标记配置已修改）
+        self.stay_on_top.blockSignals(True)
         self.stay_on_top.setChecked(stay_on_top)  # 设置复选框状态
-        if stay_on_top:
-            self.setWindowFlags(self.windowFlags() | Qt.WindowStaysOnTopHint)
-        else:
-            self.setWindowFlags(self.windowFlags() & ~Qt.WindowStaysOnTopHint)
+        self.stay_on_top.blockSignals(False)
+        self.setWindowFlag(Qt.WindowStaysOnTopHint, stay_on_top)
         
         # 如果有上次的目录，自动加载
         if self.last_directory and os.path.exists(self.last_directory):
@@ -186,14 +517,16 @@ class MainWindow(QMainWindow):
             if hasattr(self, 'is_previewing') and self.is_previewing:
                 self.stop_preview()
             
+            if getattr(self, 'synth_preview', None) is not None:
+                self.synth_preview.close()
+            
             # 停止播放
             if hasattr(self, 'midi_player'):
                 self.midi_player.stop()
             
             # 保存配置
-            if hasattr(self, 'config'):
-                self.config['last_directory'] = self.last_directory
-                self.config_manager.save(self.config)
+            if hasattr(self, 'config_manager'):
+                self._flush_config()
             
             event.accept()
             
@@ -211,7 +544,7 @@ class MainWindow(QMainWindow):
         self.stop_timers()
         
         # 保存配置
-        self.save_config()
+        self._flush_config()
         
         # 移除所有键盘钩子
         keyboard.unhook_all()
@@ -231,6 +564,19 @@ class MainWindow(QMainWindow):
         }
         self.config_manager.save(config)
 
+    def mark_config_dirty(self):
+        """标记配置已修改，5秒内没有新的修改时再写入文件"""
+        self._config_dirty = True
+        self._config_timer.start()
+
+    def _flush_config(self):
+        """配置有修改时立即写入文件"""
+        self._config_timer.stop()
+        if not self._config_dirty:
+            return
+        self._config_dirty = False
+        self.save_config()
+
     def setup_ui(self):
         """设置UI界面"""
         try:
@@ -263,13 +609,20 @@ class MainWindow(QMainWindow):
             search_layout = QHBoxLayout()
             self.search_input = QLineEdit()
             self.search_input.setPlaceholderText("搜索歌曲...")
-            self.search_input.textChanged.connect(self.filter_songs)
+            self.search_input.textChanged.connect(self.schedule_filter)
             search_layout.addWidget(self.search_input)
             left_layout.addLayout(search_layout)
             
-            # 歌曲列表
-            self.song_list = QListWidget()
-            self.song_list.itemSelectionChanged.connect(self.song_selected)
+            # 歌曲列表：文件名模型 + 过滤代理，搜索时由Qt完成匹配，不再重建列表项
+            self._song_model = SongListModel(self)
+            self._song_proxy = QSortFilterProxyModel(self)
+            self._song_proxy.setSourceModel(self._song_model)
+            self._song_proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+            self.song_list = QListView()
+            self.song_list.setModel(self._song_proxy)
+            self.song_list.setEditTriggers(QListView.NoEditTriggers)
+            self.song_list.setUniformItemSizes(True)
+            self.song_list.selectionModel().selectionChanged.connect(self.song_selected)
             left_layout.addWidget(self.song_list)
             
             main_layout.addWidget(left_widget)
@@ -334,6 +687,9 @@ class MainWindow(QMainWindow):
             
             # 预览按钮
             self.preview_button = QPushButton("预览")
+            # 样式由窗口样式表按 previewing 属性切换，避免每次重新解析样式表
+            self.preview_button.setObjectName("previewBtn")
+            self.preview_button.setProperty("previewing", False)
             self.preview_button.clicked.connect(self.toggle_preview)
             self.preview_button.setEnabled(False)
             control_layout.addWidget(self.preview_button)
@@ -377,11 +733,10 @@ class MainWindow(QMainWindow):
     def safe_key_handler(self, func):
         """安全地处理键盘事件，添加防抖动和状态检查"""
         try:
-            current_time = time.time()
-            if current_time - self.last_key_time < self.key_cooldown:
+            if self._key_timer.isValid() and self._key_timer.elapsed() < self._key_cooldown_ms:
                 return
             
-            self.last_key_time = current_time
+            self._key_timer.start()
             
             # 确保窗口可见且未最小化
             if self.isVisible() and not self.isMinimized():
@@ -390,14 +745,12 @@ class MainWindow(QMainWindow):
         except Exception as e:
             print(f"处理键盘事件时出错: {str(e)}")
 
-    def _load_midi_files(self, dir_path):
-        """加载指定目录下的所有MIDI文件"""
-        midi_files = []
-        for root, _, files in os.walk(dir_path):
-            for file in files:
-                if file.lower().endswith(('.mid', '.midi')):
-                    midi_files.append(os.path.join(root, file))
-        return midi_files
+    def _set_midi_files(self, midi_files):
+        """设置歌曲文件列表，文件名由歌曲列表模型一次性生成"""
+        self._song_model.set_files(midi_files)
+        # 与模型共用同一份列表，增删歌曲统一通过模型进行
+        self.midi_files = self._song_model.paths
+        self._basenames = self._song_model.names
 
     def select_directory(self):
         """选择MIDI文件夹"""
@@ -410,31 +763,8 @@ class MainWindow(QMainWindow):
             
             if dir_path:
                 self.last_directory = dir_path
-                self.save_config()
-                self.midi_files = self._load_midi_files(dir_path)
-                # 清空并更新歌曲列表
-                self.song_list.clear()
-                for file in self.midi_files:
-                    self.song_list.addItem(os.path.basename(file))
-                
-                # 如果有文件，选中第一个
-                if self.midi_files:
-                    self.song_list.setCurrentRow(0)
-                    self.current_index = 0
-                    self.play_button.setEnabled(True)
-                    self.stop_button.setEnabled(True)
-                    self.play_button.setText("播放")
-                    self.play_button.setStyleSheet("""
-                        QPushButton {
-                            background-color: #5cb85c;
-                            color: white;
-                            border: 1px solid #4cae4c;
-                        }
-                        QPushButton:hover {
-                            background-color: #449d44;
-                            border-color: #398439;
-                        }
-                    """)
+                self.mark_config_dirty()
+                self.load_directory(dir_path)
                 
         except Exception as e:
             print(f"选择文件夹时出错: {str(e)}")
@@ -442,34 +772,15 @@ class MainWindow(QMainWindow):
     def song_selected(self):
         """处理歌曲选择"""
         try:
-            current_item = self.song_list.currentItem()
-            if not current_item:
-                return
-                
-            # 获取当前选中项的索引
-            index = self.song_list.row(current_item)
+            # 选中项自带文件路径，不依赖列表中的行号
+            path = self.song_list.currentIndex().data(Qt.UserRole)
+            index = self.selected_song_index()
             
-            if 0 <= index < len(self.midi_files):
+            if path is not None and 0 <= index < len(self.midi_files):
                 self.current_index = index
                 
-                try:
-                    # 加载MIDI文件并分析音轨
-                    mid = mido.MidiFile(self.midi_files[index])
-                    # 先分析音轨信息
-                    self.midi_player.analyze_tracks(mid)
-                    # 然后更新音轨列表显示
-                    self.update_tracks_list()
-                    
-                except (EOFError, OSError, ValueError) as e:
-                    print(f"MIDI文件损坏或格式不正确: {str(e)}")
-                    # 从列表中移除损坏的文件
-                    self.song_list.takeItem(index)
-                    self.midi_files.pop(index)
-                    # 重置当前索引
-                    self.current_index = -1
-                    # 清空音轨列表
-                    self.tracks_list.clear()
-                    self.tracks_list.addItem("◆ 全部音轨")
+                # 在线程池中解析文件和分析音轨，完成后再更新音轨列表
+                self.request_track_analysis(path)
                     
                 # 启用播放和停止按钮
                 self.play_button.setEnabled(True)
@@ -484,6 +795,73 @@ class MainWindow(QMainWindow):
             print(f"选择歌曲时出错: {str(e)}")
             self.current_index = -1
 
+    def selected_song_index(self):
+        """返回当前选中歌曲在 midi_files 中的索引，没有选中时返回 -1"""
+        proxy_index = self.song_list.currentIndex()
+        if not proxy_index.isValid():
+            return -1
+        return self._song_proxy.mapToSource(proxy_index).row()
+
+    def select_song(self, index):
+        """选中 midi_files 中指定索引的歌曲（被搜索过滤掉时不选中）"""
+        self._song_model.fetch_until(index)
+        proxy_index = self._song_proxy.mapFromSource(self._song_model.index(index))
+        if proxy_index.isValid():
+            self.song_list.setCurrentIndex(proxy_index)
+
+    def request_track_analysis(self, path):
+        """提交音轨分析任务，结果通过信号回到界面线程"""
+        try:
+            key = (path, os.path.getmtime(path), self.midi_player.note_offset)
+        except OSError:
+            key = None
+
+        if key in self._track_cache:
+            # 文件未修改过，直接使用上次的分析结果
+            self._analysis_path = None
+            tracks_info, items = self._track_cache[key]
+            self.midi_player.tracks_info = tracks_info
+            self.update_tracks_list(items)
+            return
+
+        self._analysis_path = path
+        self._analysis_key = key
+        task = TrackAnalysisTask(path, self.midi_player.note_offset)
+        task.signals.finished.connect(self.on_track_analysis_finished)
+        task.signals.failed.connect(self.on_track_analysis_failed)
+        QThreadPool.globalInstance().start(task)
+
+    def on_track_analysis_finished(self, path, tracks_info, items):
+        """音轨分析完成"""
+        # 期间已经选择了其他歌曲，丢弃过期的结果
+        if path != self._analysis_path:
+            return
+        self._analysis_path = None
+        if self._analysis_key is not None:
+            self._track_cache[self._analysis_key] = (tracks_info, items)
+            if len(self._track_cache) > TRACK_CACHE_SIZE:
+                # 移除最早缓存的结果
+                del self._track_cache[next(iter(self._track_cache))]
+        self.midi_player.tracks_info = tracks_info
+        self.update_tracks_list(items)
+
+    def on_track_analysis_failed(self, path, error):
+        """MIDI文件无法解析"""
+        if path != self._analysis_path:
+            return
+        self._analysis_path = None
+        print(f"MIDI文件损坏或格式不正确: {error}")
+        try:
+            # 按路径从列表中移除损坏的文件
+            self._song_model.remove_file(path)
+        except ValueError:
+            pass
+        # 重置当前索引
+        self.current_index = -1
+        # 清空音轨列表
+        self.tracks_list.clear()
+        self.tracks_list.addItem("◆ 全部音轨")
+
     def format_time(self, seconds):
         """将秒数格式化为 mm:ss 格式"""
         minutes = int(seconds // 60)
@@ -498,7 +876,11 @@ class MainWindow(QMainWindow):
             
             if total_time > 0:
                 remaining_time = max(0, total_time - current_time)
-                self.time_label.setText(f"剩余时间: {self.format_time(remaining_time)}")
+                # 只在显示的整秒数变化时更新标签，避免重复重绘
+                remaining_sec = int(remaining_time)
+                if remaining_sec != self._last_remaining_sec:
+                    self._last_remaining_sec = remaining_sec
+                    self.time_label.setText(f"剩余时间: {self.format_time(remaining_time)}")
                 
                 # 如果播放结束，自动停止
                 if remaining_time == 0:
@@ -516,23 +898,11 @@ class MainWindow(QMainWindow):
             self.play_button.setEnabled(has_file)
             if is_playing:
                 if is_paused:  # 如果暂停中
-                    self.play_button.setText("继续")
+                    self.set_play_button("继续", PLAY_BUTTON_PLAYING_STYLE)
                 else:  # 如果正在播放
-                    self.play_button.setText("暂停")
-                self.play_button.setStyleSheet("""
-                    QPushButton {
-                        background-color: #f0ad4e;
-                        color: white;
-                        border: 1px solid #eea236;
-                    }
-                    QPushButton:hover {
-                        background-color: #ec971f;
-                        border-color: #d58512;
-                    }
-                """)
+                    self.set_play_button("暂停", PLAY_BUTTON_PLAYING_STYLE)
             else:  # 如果未播放
-                self.play_button.setText("播放")
-                self.play_button.setStyleSheet("")
+                self.set_play_button("播放", "")
             
             # 更新停止按钮状态
             self.stop_button.setEnabled(is_playing)
@@ -544,6 +914,15 @@ class MainWindow(QMainWindow):
         except Exception as e:
             print(f"更新按钮状态时出错: {str(e)}")
 
+    def set_play_button(self, text, style):
+        """设置播放按钮的文字和样式，状态未变化时不重复设置（避免重新解析样式表）"""
+        state = (text, style)
+        if state == self._play_button_state:
+            return
+        self._play_button_state = state
+        self.play_button.setText(text)
+        self.play_button.setStyleSheet(style)
+
     def start_playback(self):
         """开始播放MIDI文件"""
         try:
@@ -591,6 +970,7 @@ class MainWindow(QMainWindow):
                 if self.progress_timer.isActive():
                     self.progress_timer.stop()
                 self.time_label.setText("剩余时间: 00:00")
+                self._last_remaining_sec = -1
             elif state == "pause":
                 if self.midi_player.paused:
                     if self.progress_timer.isActive():
@@ -655,7 +1035,7 @@ class MainWindow(QMainWindow):
             
             # 更新索引和UI
             self.current_index = new_index
-            self.song_list.setCurrentRow(new_index)
+            self.select_song(new_index)
             
             # 自动开始播放新选择的歌曲
             self.start_playback()
@@ -667,7 +1047,7 @@ class MainWindow(QMainWindow):
     def update_ui_after_song_change(self, new_index):
         """在主线程中更新UI"""
         # 更新列表选择
-        self.song_list.setCurrentRow(new_index)
+        self.select_song(new_index)
         
         # 如果正在播放，停止当前播放并开始新歌曲
         was_playing = self.midi_player.playing
@@ -681,90 +1061,20 @@ class MainWindow(QMainWindow):
         if self.progress_timer.isActive():
             self.progress_timer.stop()
 
-    def update_tracks_list(self):
+    def update_tracks_list(self, items):
         """更新音轨列表显示"""
         try:
             self.tracks_list.clear()
             
             # 更新当前歌曲名称
             if 0 <= self.current_index < len(self.midi_files):
-                current_song = os.path.basename(self.midi_files[self.current_index])
+                current_song = self._basenames[self.current_index]
                 self.current_song_label.setText(f"当前歌曲：{current_song}")
             else:
                 self.current_song_label.setText("当前歌曲：未选择")
                 return  # 如果没有选择歌曲，直接返回
             
-            # 获取当前MIDI文件
-            current_file = self.midi_files[self.current_index]
-            mid = mido.MidiFile(current_file)
-            
-            # 获取所有音轨的音符信息
-            all_notes = []
-            track_notes_dict = {}
-            
-            # 首先统计所有音轨的音符信息
-            for i, track in enumerate(mid.tracks):
-                track_notes = []
-                track_velocities = []
-                
-                for msg in track:
-                    if msg.type == 'note_on' and msg.velocity > 0:
-                        track_notes.append(msg.note)
-                        track_velocities.append(msg.velocity)
-                        all_notes.append(msg.note)
-                
-                if track_notes:  # 只处理包含音符的音轨
-                    track_notes_dict[i] = {
-                        'notes': track_notes,
-                        'velocity': track_velocities,
-                        'channel': getattr(msg, 'channel', 0)
-                    }
-            
-            # 计算全部音轨的统计信息
-            if all_notes:
-                min_note = min(all_notes)
-                max_note = max(all_notes)
-                total_notes = len(all_notes)
-                playable_notes = sum(1 for note in all_notes 
-                                   if 36 <= (note + self.midi_player.note_offset) <= 96)
-                
-                # 计算平均力度
-                all_velocities = []
-                for track_info in track_notes_dict.values():
-                    all_velocities.extend(track_info['velocity'])
-                avg_velocity = sum(all_velocities) / len(all_velocities) if all_velocities else 0
-                
-                # 添加全部音轨选项，包含详细信息
-                all_tracks_text = (
-                    f"◆ 全部音轨 [音符总数: {total_notes}]\n"
-                    f"├ 音符范围: {min_note}-{max_note} → {min_note + self.midi_player.note_offset}-"
-                    f"{max_note + self.midi_player.note_offset}\n"
-                    f"├ 可播放: {playable_notes}/{total_notes} ({playable_notes/total_notes*100:.1f}%)\n"
-                    f"└ 平均力度: {avg_velocity:.1f}"
-                )
-                self.tracks_list.addItem(all_tracks_text)
-                
-                # 添加各个音轨的详细信息
-                for i, track_info in track_notes_dict.items():
-                    track_notes = track_info['notes']
-                    velocities = track_info['velocity']
-                    channel = track_info['channel']
-                    
-                    min_note = min(track_notes)
-                    max_note = max(track_notes)
-                    total_notes = len(track_notes)
-                    playable_notes = sum(1 for note in track_notes 
-                                       if 36 <= (note + self.midi_player.note_offset) <= 96)
-                    avg_velocity = sum(velocities) / len(velocities) if velocities else 0
-                    
-                    track_text = (
-                        f"◇ 音轨 {i} [音符数: {total_notes}, 通道: {channel}]\n"
-                        f"├ 音符范围: {min_note}-{max_note} → "
-                        f"{min_note + self.midi_player.note_offset}-{max_note + self.midi_player.note_offset}\n"
-                        f"├ 可播放: {playable_notes}/{total_notes} ({playable_notes/total_notes*100:.1f}%)\n"
-                        f"└ 平均力度: {avg_velocity:.1f}"
-                    )
-                    self.tracks_list.addItem(track_text)
+            self._add_list_items(self.tracks_list, items)
             
             # 默认选择全部音轨
             if self.tracks_list.count() > 0:
@@ -779,6 +1089,16 @@ class MainWindow(QMainWindow):
             self.tracks_list.setCurrentRow(0)
             self.midi_player.set_track(None)
 
+    def _add_list_items(self, list_widget, items):
+        """批量添加列表项，只触发一次模型更新和重绘"""
+        list_widget.setUpdatesEnabled(False)
+        list_widget.blockSignals(True)
+        try:
+            list_widget.addItems(items)
+        finally:
+            list_widget.blockSignals(False)
+            list_widget.setUpdatesEnabled(True)
+
     def track_selected(self):
         """处理音轨选择变化"""
         try:
@@ -819,31 +1139,22 @@ class MainWindow(QMainWindow):
             self.tracks_list.setCurrentRow(0)
             self.midi_player.set_track(None)
 
+    def schedule_filter(self, text):
+        """记录搜索文本并重新开始防抖计时"""
+        self._pending_filter = text
+        self._filter_timer.start()
+
     @handle_error("过滤歌曲")
     def filter_songs(self, text):
-        """根据搜索文本过滤歌曲列表"""
-        search_text = text.lower()
-        self.song_list.clear()
-        
-        if not search_text:
-            # 如果搜索框为空，显示所有歌曲
-            for file in self.midi_files:
-                self.song_list.addItem(os.path.basename(file))
-        else:
-            # 否则显示匹配的歌曲
-            for file in self.midi_files:
-                filename = os.path.basename(file).lower()
-                if search_text in filename:
-                    self.song_list.addItem(os.path.basename(file))
+        """根据搜索文本过滤歌曲列表（不区分大小写）"""
+        if text:
+            # 尚未提供给视图的歌曲也要参与搜索
+            self._song_model.fetch_all()
+        self._song_proxy.setFilterFixedString(text)
         
-        # 如果之前有选中的歌曲，尝试重新选中
-        if self.current_index >= 0 and self.current_index < len(self.midi_files):
-            current_file = os.path.basename(self.midi_files[self.current_index])
-            # 查找当前歌曲在过滤后列表中的位置
-            for i in range(self.song_list.count()):
-                if self.song_list.item(i).text() == current_file:
-                    self.song_list.setCurrentRow(i)
-                    break
+        # 当前歌曲之前被过滤掉时，重新显示后再次选中
+        if 0 <= self.current_index < len(self.midi_files) and not self.song_list.currentIndex().isValid():
+            self.select_song(self.current_index)
                         
     def clear_search(self):
         """清除搜索框并显示所有歌曲"""
@@ -852,11 +1163,14 @@ class MainWindow(QMainWindow):
 
     def toggle_stay_on_top(self, state):
         """切换窗口置顶状态"""
-        if state == Qt.Checked:
-            self.setWindowFlags(self.windowFlags() | Qt.WindowStaysOnTopHint)
-        else:
-            self.setWindowFlags(self.windowFlags() & ~Qt.WindowStaysOnTopHint)
-        self.show()  # 需要重新显示窗口以应用更改
+        stay_on_top = state == Qt.Checked
+        # 已经是目标状态时不再修改窗口标志（修改会重建原生窗口）
+        if bool(self.windowFlags() & Qt.WindowStaysOnTopHint) != stay_on_top:
+            was_visible = self.isVisible()
+            self.setWindowFlag(Qt.WindowStaysOnTopHint, stay_on_top)
+            if was_visible:
+                self.show()  # 修改窗口标志后窗口会被隐藏，需要重新显示
+        self.mark_config_dirty()
 
     def toggle_play(self):
         """切换播放/暂停状态"""
@@ -880,57 +1194,19 @@ class MainWindow(QMainWindow):
         try:
             if state == "playback":
                 # 播放状态，显示暂停按钮
-                self.play_button.setText("暂停")
-                self.play_button.setStyleSheet("""
-                    QPushButton {
-                        background-color: #f0ad4e;
-                        color: white;
-                        border: 1px solid #eea236;
-                    }
-                    QPushButton:hover {
-                        background-color: #ec971f;
-                        border-color: #d58512;
-                    }
-                """)
+                self.set_play_button("暂停", PLAY_BUTTON_PLAYING_STYLE)
                 self.stop_button.setEnabled(True)
                 self.preview_button.setEnabled(False)
                 
             elif state == "pause":
                 # 暂停状态，显示继续按钮
-                self.play_button.setText("继续")
-                self.play_button.setStyleSheet("""
-                    QPushButton {
-                        background-color: #5bc0de;
-                        color: white;
-                        border: 1px solid #46b8da;
-                    }
-                    QPushButton:hover {
-                        background-color: #31b0d5;
-                        border-color: #269abc;
-                    }
-                """)
+                self.set_play_button("继续", PLAY_BUTTON_PAUSED_STYLE)
                 self.stop_button.setEnabled(True)
                 self.preview_button.setEnabled(False)
                 
             elif state == "stop":
                 # 停止状态，显示播放按钮
-                self.play_button.setText("播放")
-                self.play_button.setStyleSheet("""
-                    QPushButton {
-                        background-color: #5cb85c;
-                        color: white;
-                        border: 1px solid #4cae4c;
-                    }
-                    QPushButton:hover {
-                        background-color: #449d44;
-                        border-color: #398439;
-                    }
-                    QPushButton:disabled {
-                        background-color: #f0f0f0;
-                        color: #888;
-                        border: 1px solid #ccc;
-                    }
-                """)
+                self.set_play_button("播放", PLAY_BUTTON_STOPPED_STYLE)
                 self.stop_button.setEnabled(False)
                 self.preview_button.setEnabled(True)
                 
@@ -957,16 +1233,46 @@ class MainWindow(QMainWindow):
             print(f"检查窗口状态时出错: {str(e)}")
 
     def load_directory(self, dir_path):
-        """加载指定目录的MIDI文件"""
-        self.midi_files = self._load_midi_files(dir_path)
+        """加载指定目录的MIDI文件，扫描在后台进行，找到的歌曲分批加入列表"""
+        # 停止上一次尚未完成的扫描
+        self._scan_cancel.set()
+        self._scan_cancel = threading.Event()
+        self._scan_generation += 1
+        
+        self._set_midi_files([])
+        self.current_index = -1
         self.search_input.clear()
-        self.update_song_list()
+        self._filter_timer.stop()  # 直接显示全部歌曲
+        self._song_proxy.setFilterFixedString("")
+        
+        task = DirectoryScanTask(dir_path, self._scan_generation, self._scan_cancel)
+        task.signals.batch_ready.connect(self.on_scan_batch)
+        task.signals.finished.connect(self.on_scan_finished)
+        QThreadPool.globalInstance().start(task)
+
+    def on_scan_batch(self, generation, paths):
+        """收到一批扫描到的MIDI文件"""
+        if generation != self._scan_generation:
+            return
+        first_batch = not self.midi_files
+        self._song_model.append_files(paths)
+        if self.search_input.text():
+            # 正在搜索时新歌曲也要参与过滤
+            self._song_model.fetch_all()
+        
+        # 收到第一批文件时选中第一首
+        if first_batch:
+            self.select_song(0)
+            self.current_index = 0
+            self.play_button.setEnabled(True)
+            self.stop_button.setEnabled(True)
+            self.set_play_button("播放", PLAY_BUTTON_READY_STYLE)
 
-    def update_song_list(self):
-        """更新歌曲列表显示"""
-        self.song_list.clear()
-        for file in self.midi_files:
-            self.song_list.addItem(os.path.basename(file))
+    def on_scan_finished(self, generation):
+        """目录扫描完成"""
+        if generation != self._scan_generation:
+            return
+        print(f"共找到 {len(self.midi_files)} 个MIDI文件")
 
     @pyqtSlot()
     def update_ui_after_playback(self):
@@ -1004,6 +1310,8 @@ class MainWindow(QMainWindow):
             # 停止当前播放
             if pygame.mixer.music.get_busy():
                 pygame.mixer.music.stop()
+            if self.synth_preview is not None:
+                self.synth_preview.stop()
             
             # 获取当前选中的音轨
             current_row = self.tracks_list.currentRow()
@@ -1011,54 +1319,52 @@ class MainWindow(QMainWindow):
                 return
             
             # 加载MIDI文件
-            mid = mido.MidiFile(current_file)
+            mid = load_midi_file(current_file)
             
-            # 创建临时MIDI文件用于预览
-            preview_mid = mido.MidiFile()
+            # 复用预览用的MIDI对象和控制轨道，每次只替换其中的音轨
+            if self._preview_mid is None:
+                self._preview_mid = mido.MidiFile(type=1)
+                self._preview_control_track = mido.MidiTrack()
+            preview_mid = self._preview_mid
             preview_mid.ticks_per_beat = mid.ticks_per_beat
+            preview_mid.tracks.clear()
             
-            # 创建控制轨道
-            control_track = mido.MidiTrack()
+            control_track = self._preview_control_track
+            control_track.clear()
             preview_mid.tracks.append(control_track)
             
-            # 处理音轨
+            # 处理音轨：音符轨道只保存原音轨的视图，写入文件时才逐条生成移调后的消息
+            note_offset = self.midi_player.note_offset
+            any_note = False
             if current_row == 0:  # 全部音轨
                 for track in mid.tracks:
-                    track_copy = mido.MidiTrack()
-                    for msg in track:
-                        if msg.type in ['note_on', 'note_off']:
-                            msg_copy = msg.copy()
-                            if hasattr(msg, 'note'):
-                                adjusted_note = msg.note + self.midi_player.note_offset
-                                if 36 <= adjusted_note <= 96:
-                                    msg_copy.note = adjusted_note
-                                    track_copy.append(msg_copy)
-                        elif msg.type in ['set_tempo', 'time_signature']:
-                            control_track.append(msg.copy())
-                    if len(track_copy) > 0:
-                        preview_mid.tracks.append(track_copy)
+                    control_track.extend(msg for msg in track if msg.type in CONTROL_MESSAGE_TYPES)
+                    track_view = PreviewTrack(track, note_offset)
+                    if track_view.has_notes():
+                        preview_mid.tracks.append(track_view)
+                        any_note = True
             else:  # 单个音轨
                 track_index = current_row - 1
                 if track_index < len(mid.tracks):
                     track = mid.tracks[track_index]
-                    track_copy = mido.MidiTrack()
-                    for msg in track:
-                        if msg.type in ['note_on', 'note_off']:
-                            msg_copy = msg.copy()
-                            if hasattr(msg, 'note'):
-                                adjusted_note = msg.note + self.midi_player.note_offset
-                                if 36 <= adjusted_note <= 96:
-                                    msg_copy.note = adjusted_note
-                                    track_copy.append(msg_copy)
-                        elif msg.type in ['set_tempo', 'time_signature']:
-                            control_track.append(msg.copy())
-                    if len(track_copy) > 0:
-                        preview_mid.tracks.append(track_copy)
-            
-            if len(preview_mid.tracks) <= 1:  # 只有控制轨道
+                    control_track.extend(msg for msg in track if msg.type in CONTROL_MESSAGE_TYPES)
+                    track_view = PreviewTrack(track, note_offset)
+                    if track_view.has_notes():
+                        preview_mid.tracks.append(track_view)
+                        any_note = True
+            
+            if not any_note:  # 只有控制轨道
                 print("没有可播放的音符")
                 return
             
+            if self.synth_preview is not None:
+                # 直接按内存中的音符事件合成，无需写入临时文件
+                self.synth_preview.play(preview_mid)
+                preview_mid.tracks.clear()
+                control_track.clear()
+                self.begin_preview_state()
+                return
+            
             # 修改临时文件的创建方式：直接在当前目录创建
             temp_file = f"_preview_{os.path.basename(current_file)}"
             
@@ -1071,30 +1377,17 @@ class MainWindow(QMainWindow):
                         print(f"删除已存在的临时文件失败: {str(e)}")
                         return
                     
-                # 保存并播放预览文件
-                preview_mid.save(temp_file)
+                # 先在内存中序列化，再一次性写入预览文件
+                buffer = io.BytesIO()
+                preview_mid.save(file=buffer)
+                with open(temp_file, 'wb', buffering=0) as f:
+                    f.write(buffer.getbuffer())
+                # 写入后不再持有原MIDI文件的消息
+                preview_mid.tracks.clear()
+                control_track.clear()
                 pygame.mixer.music.load(temp_file)
                 pygame.mixer.music.play()
-                
-                # 更新状态和按钮
-                self.is_previewing = True
-                self.preview_button.setText("停止预览")
-                self.preview_button.setStyleSheet("""
-                    QPushButton {
-                        background-color: #d9534f;
-                        color: white;
-                        border: 1px solid #d43f3a;
-                    }
-                    QPushButton:hover {
-                        background-color: #c9302c;
-                        border-color: #ac2925;
-                    }
-                """)
-                
-                # 添加预览完成检测
-                self.preview_check_timer = QTimer()
-                self.preview_check_timer.timeout.connect(self.check_preview_status)
-                self.preview_check_timer.start(100)  # 每100ms检查一次
+                self.begin_preview_state()
                 
             finally:
                 # 设置延迟删除临时文件
@@ -1104,9 +1397,31 @@ class MainWindow(QMainWindow):
             print(f"预览时出错: {str(e)}")
             self.stop_preview()
 
+    def begin_preview_state(self):
+        """预览开始后更新状态和按钮"""
+        self.is_previewing = True
+        self.preview_button.setText("停止预览")
+        self.set_preview_button_style(True)
+        
+        # 添加预览完成检测
+        self.preview_check_timer = QTimer()
+        self.preview_check_timer.timeout.connect(self.check_preview_status)
+        self.preview_check_timer.start(100)  # 每100ms检查一次
+
+    def set_preview_button_style(self, previewing):
+        """切换预览按钮的样式状态"""
+        self.preview_button.setProperty("previewing", previewing)
+        style = self.preview_button.style()
+        style.unpolish(self.preview_button)
+        style.polish(self.preview_button)
+
     def check_preview_status(self):
         """检查预览播放状态"""
-        if self.is_previewing and not pygame.mixer.music.get_busy():
+        if self.synth_preview is not None:
+            busy = self.synth_preview.is_busy()
+        else:
+            busy = pygame.mixer.music.get_busy()
+        if self.is_previewing and not busy:
             self.stop_preview()
             if hasattr(self, 'preview_check_timer') and self.preview_check_timer.isActive():
                 self.preview_check_timer.stop()
@@ -1123,33 +1438,11 @@ class MainWindow(QMainWindow):
         """停止预览"""
         try:
             pygame.mixer.music.stop()
+            if self.synth_preview is not None:
+                self.synth_preview.stop()
             self.is_previewing = False
             self.preview_button.setText("预览")
-            # 设置默认样式而不是清空样式表
-            self.preview_button.setStyleSheet("""
-                QPushButton {
-                    background-color: #ffffff;
-                    border: 1px solid #cccccc;
-                    border-radius: 4px;
-                    padding: 5px 15px;
-                    min-width: 80px;
-                    color: #333333;
-                    font-size: 14px;
-                }
-                QPushButton:hover {
-                    background-color: #e6e6e6;
-                    border-color: #adadad;
-                }
-                QPushButton:pressed {
-                    background-color: #d4d4d4;
-                    border-color: #8c8c8c;
-                }
-                QPushButton:disabled {
-                    background-color: #f0f0f0;
-                    color: #888;
-                    border: 1px solid #ccc;
-                }
-            """)
+            self.set_preview_button_style(False)
             
             # 停止预览状态检查定时器
             if hasattr(self, 'preview_check_timer') and self.preview_check_timer.isActive():
@@ -1162,54 +1455,49 @@ class MainWindow(QMainWindow):
         """加载MIDI文件的音轨信息"""
         try:
             self.tracks_list.clear()
-            mid = mido.MidiFile(midi_file)
+            mid = load_midi_file(midi_file)
             
-            # 添加"全部音轨"选项
-            all_notes = []  # 存储所有音轨的所有音符事件
-            track_notes_dict = {}  # 用字典存储每个音轨的音符信息
+            note_offset = self.midi_player.note_offset
+            items = []
+            track_hists = {}  # 每个音轨的128格音符直方图（包括重复音符）
             
             # 首先统计所有音轨的音符信息
             for i, track in enumerate(mid.tracks):
-                track_notes = []  # 存储当前音轨的所有音符事件（包括重复音符）
+                hist = [0] * 128
                 
                 for msg in track:
-                    if msg.type == 'note_on' and msg.velocity > 0:  # 只统计 note_on 事件
-                        track_notes.append(msg.note)
-                        all_notes.append(msg.note)
-            
-                if track_notes:  # 只处理包含音符的音轨
-                    track_notes_dict[i] = track_notes
-            
-            # 计算全部音轨的统计信息
-            if all_notes:  # 使用所有音符事件
-                min_note = min(all_notes)
-                max_note = max(all_notes)
-                total_notes = len(all_notes)  # 所有音符事件的总数
-                playable_notes = sum(1 for note in all_notes 
-                                   if 36 <= (note + self.midi_player.note_offset) <= 96)
+                    if msg.type != 'note_on':  # 只统计 note_on 事件
+                        continue
+                    if msg.velocity > 0:
+                        hist[msg.note] += 1
+            
+                if any(hist):  # 只处理包含音符的音轨
+                    track_hists[i] = hist
+            
+            # 计算全部音轨的统计信息：直接累加各音轨的直方图
+            if track_hists:
+                all_hist = [sum(counts) for counts in zip(*track_hists.values())]
+                min_note, max_note, total_notes, playable_notes = note_histogram_stats(all_hist, note_offset)
                 
                 # 添加全部音轨选项
-                adjusted_min = min_note + self.midi_player.note_offset
-                adjusted_max = max_note + self.midi_player.note_offset
+                adjusted_min = min_note + note_offset
+                adjusted_max = max_note + note_offset
                 all_tracks_text = (f"全部音轨 [原始范围: {min_note}-{max_note}, "
                                  f"调整后: {adjusted_min}-{adjusted_max}, "
                                  f"可播放: {playable_notes}/{total_notes}]")
-                self.tracks_list.addItem(all_tracks_text)
+                items.append(all_tracks_text)
             
             # 添加单个音轨
-            for i, track_notes in track_notes_dict.items():
-                if track_notes:  # 确保音轨有音符
-                    min_note = min(track_notes)
-                    max_note = max(track_notes)
-                    total_notes = len(track_notes)  # 使用所有音符事件的数量
-                    playable_notes = sum(1 for note in track_notes 
-                                       if 36 <= (note + self.midi_player.note_offset) <= 96)
-                    
-                    track_text = (f"音轨 {i} [原始范围: {min_note}-{max_note}, "
-                                f"调整后: {min_note + self.midi_player.note_offset}-"
-                                f"{max_note + self.midi_player.note_offset}, "
-                                f"可播放: {playable_notes}/{total_notes}]")
-                    self.tracks_list.addItem(track_text)
+            for i, hist in track_hists.items():
+                min_note, max_note, total_notes, playable_notes = note_histogram_stats(hist, note_offset)
+                
+                track_text = (f"音轨 {i} [原始范围: {min_note}-{max_note}, "
+                            f"调整后: {min_note + note_offset}-"
+                            f"{max_note + note_offset}, "
+                            f"可播放: {playable_notes}/{total_notes}]")
+                items.append(track_text)
+            
+            self._add_list_items(self.tracks_list, items)
             
             # 默认选择第一个音轨
             if self.tracks_list.count() > 0:
@@ -1226,11 +1514,11 @@ class MainWindow(QMainWindow):
                 # 显示提示信息
                 print("请先停止当前播放再选择新歌曲")
                 # 恢复之前的选中状态
-                if 0 <= self.current_index < self.song_list.count():
-                    self.song_list.setCurrentRow(self.current_index)
+                if 0 <= self.current_index < len(self.midi_files):
+                    self.select_song(self.current_index)
                 return
             
-            new_index = self.song_list.currentRow()
+            new_index = self.selected_song_index()
             if new_index != self.current_index:
                 # 更新索引
                 self.current_index = new_index
@@ -1238,13 +1526,7 @@ class MainWindow(QMainWindow):
                 
                 # 更新音轨列表
                 if 0 <= new_index < len(self.midi_files):
-                    try:
-                        mid = mido.MidiFile(self.midi_files[new_index])
-                        self.midi_player.analyze_tracks(mid)
-                        self.update_tracks_list()
-                    except Exception as e:
-                        print(f"加载MIDI文件失败: {str(e)}")
-                        return
+                    self.request_track_analysis(self.midi_files[new_index])
                 
                 # 启用播放按钮
                 self.play_button.setEnabled(True)
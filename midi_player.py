@@ -5,8 +5,14 @@ import keyboard
 import mido
 import ctypes
 from keyboard_mapping import NOTE_TO_KEY
+from key_sender import create_key_sender
+from window_events import create_foreground_hook
 from collections import defaultdict
-import weakref
+from collections import deque
+from operator import itemgetter
+from functools import lru_cache
+from bisect import bisect_left
+from array import array
 from PyQt5.QtCore import QObject, pyqtSignal
 
 # 延迟导入 win32gui
@@ -18,6 +24,173 @@ def get_win32gui():
         print("警告: 无法导入 win32gui，窗口检测功能将不可用")
         return None
 
+# 时间相差不超过该值（纳秒）的音符视为同时发声，按键一次发送
+CHORD_WINDOW_NS = 1_000_000
+
+# 离目标时间不足该值（纳秒）时不再 sleep，改为让出时间片等待，避免 sleep 睡过头
+SPIN_THRESHOLD_NS = 2_000_000
+
+# 长时间等待时每次 sleep 的最长时间（纳秒），期间可以及时发现停止播放
+MAX_SLEEP_SLICE_NS = 100_000_000
+
+def sleep_until_ns(deadline, keep_waiting=None):
+    """等待到 perf_counter_ns() 的指定时间点：先 sleep 到临近目标，最后一小段让出时间片轮询
+
+    给出 keep_waiting 时，长时间等待分段 sleep，每段之后检查一次，返回 False 表示提前结束。
+    """
+    remaining = deadline - time.perf_counter_ns()
+    while remaining > SPIN_THRESHOLD_NS:
+        if keep_waiting is None:
+            time.sleep((remaining - SPIN_THRESHOLD_NS) / 1e9)
+            break
+        time.sleep(min(remaining - SPIN_THRESHOLD_NS, MAX_SLEEP_SLICE_NS) / 1e9)
+        if not keep_waiting():
+            return False
+        remaining = deadline - time.perf_counter_ns()
+    while time.perf_counter_ns() < deadline:
+        time.sleep(0)
+    return True
+
+# 和弦队列最多提前准备的和弦数
+CHORD_QUEUE_SIZE = 4096
+
+# 最多保留几首歌曲的预处理结果（重新播放同一首歌时不必重新解析文件）
+PREPROCESS_CACHE_SIZE = 8
+
+def group_chords(notes):
+    """把按时间排序的 (绝对时间纳秒, 音符) 列表合并成 (时间, [音符...]) 的和弦列表"""
+    chords = []
+    chord_time = None
+    for event_time, note in notes:
+        if chord_time is not None and event_time - chord_time <= CHORD_WINDOW_NS:
+            chords[-1][1].append(note)
+        else:
+            chord_time = event_time
+            chords.append((event_time, [note]))
+    return chords
+
+def load_midi_file(path):
+    """加载MIDI文件，越界的数据字节直接截断，元信息文本统一按latin1解码"""
+    return mido.MidiFile(path, clip=True, charset='latin1')
+
+# 解码音轨名称时依次尝试的编码
+TRACK_NAME_ENCODINGS = ('utf-8', 'gbk', 'shift-jis')
+
+def _is_valid_track_name(text):
+    """解码结果非空且不含控制字符时才认为有效"""
+    return bool(text) and not any(ord(c) < 32 for c in text)
+
+@lru_cache(maxsize=256)
+def decode_track_name_bytes(name):
+    """依次尝试常见编码解码音轨名称，都不合适时返回 None"""
+    # 纯 ASCII 的名称用任何一种编码解码结果都相同，不必逐个尝试
+    if name.isascii():
+        text = name.decode('ascii')
+        return text if _is_valid_track_name(text) else None
+    
+    # 尝试不同的编码方式（gb2312 是 gbk 的子集；含非 ASCII 字节时 ascii 必然失败，都不必再试）
+    for encoding in TRACK_NAME_ENCODINGS:
+        try:
+            decoded = name.decode(encoding)
+            # 如果成功解码并且结果看起来是有效的
+            if _is_valid_track_name(decoded):
+                return decoded
+        except UnicodeDecodeError:  # 替换裸异常为具体异常类型
+            continue
+    return None
+
+def set_timer_resolution(enabled):
+    """在 Windows 上把系统计时器精度设为 1ms（或恢复），使短时间的 sleep 更准确"""
+    try:
+        winmm = ctypes.windll.winmm
+    except (AttributeError, OSError):
+        return
+    try:
+        if enabled:
+            winmm.timeBeginPeriod(1)
+        else:
+            winmm.timeEndPeriod(1)
+    except Exception as e:
+        print(f"设置计时器精度时出错: {str(e)}")
+
+def get_window_pid(hwnd):
+    """返回窗口所属进程的 ID，无法获取时返回 0（不读取窗口标题，不会向目标进程发送消息）"""
+    if not hwnd:
+        return 0
+    try:
+        user32 = ctypes.windll.user32
+        pid = ctypes.c_ulong(0)
+        user32.GetWindowThreadProcessId(ctypes.c_void_p(hwnd), ctypes.byref(pid))
+        return pid.value
+    except Exception:
+        return 0
+
+THREAD_PRIORITY_NORMAL = 0
+THREAD_PRIORITY_TIME_CRITICAL = 15
+
+def raise_thread_priority():
+    """把当前线程设为最高优先级，并注册为 Pro Audio 多媒体任务
+
+    返回 AvSetMmThreadCharacteristicsW 的任务句柄（失败时为 None），播放结束后交给 restore_thread_priority。
+    """
+    try:
+        kernel32 = ctypes.windll.kernel32
+    except (AttributeError, OSError):
+        return None
+    try:
+        kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_PRIORITY_TIME_CRITICAL)
+    except Exception as e:
+        print(f"设置线程优先级时出错: {str(e)}")
+    try:
+        avrt = ctypes.windll.avrt
+        avrt.AvSetMmThreadCharacteristicsW.restype = ctypes.c_void_p
+        task_index = ctypes.c_ulong(0)
+        return avrt.AvSetMmThreadCharacteristicsW("Pro Audio", ctypes.byref(task_index)) or None
+    except Exception as e:
+        print(f"注册多媒体线程时出错: {str(e)}")
+        return None
+
+def restore_thread_priority(task_handle):
+    """恢复 raise_thread_priority 修改过的线程优先级"""
+    try:
+        kernel32 = ctypes.windll.kernel32
+    except (AttributeError, OSError):
+        return
+    try:
+        if task_handle:
+            avrt = ctypes.windll.avrt
+            avrt.AvRevertMmThreadCharacteristics.argtypes = [ctypes.c_void_p]
+            avrt.AvRevertMmThreadCharacteristics(task_handle)
+        kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_PRIORITY_NORMAL)
+    except Exception as e:
+        print(f"恢复线程优先级时出错: {str(e)}")
+
+def pin_thread_to_cpu(cpu):
+    """把当前线程固定在指定的 CPU 上，返回原来的亲和性掩码（cpu 为 None 或失败时返回 None）"""
+    if cpu is None:
+        return None
+    try:
+        kernel32 = ctypes.windll.kernel32
+    except (AttributeError, OSError):
+        return None
+    try:
+        kernel32.SetThreadAffinityMask.restype = ctypes.c_size_t
+        kernel32.SetThreadAffinityMask.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        return kernel32.SetThreadAffinityMask(kernel32.GetCurrentThread(), 1 << cpu) or None
+    except Exception as e:
+        print(f"设置线程 CPU 亲和性时出错: {str(e)}")
+        return None
+
+def restore_thread_affinity(old_mask):
+    """恢复 pin_thread_to_cpu 修改过的线程亲和性"""
+    if not old_mask:
+        return
+    try:
+        kernel32 = ctypes.windll.kernel32
+        kernel32.SetThreadAffinityMask(kernel32.GetCurrentThread(), old_mask)
+    except Exception as e:
+        print(f"恢复线程 CPU 亲和性时出错: {str(e)}")
+
 def is_admin():
     """检查是否具有管理员权限"""
     try:
@@ -43,19 +216,51 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
         if not check_admin_rights():
             raise PermissionError("需要管理员权限才能运行此工具")
             
+        # 播放/暂停状态用 Event 保存，播放线程读取时不需要加锁。
+        # playing、paused、auto_paused、selected_track 都是单个字段的赋值，播放线程直接读取；
+        # _lock 只用于需要同时修改多个字段的场合（开始、停止、暂停/继续时的计时）
+        self._state_version = 0  # 播放状态或所选音轨每次变化时加一，播放线程据此判断是否需要重新读取
+        self._playing_evt = threading.Event()
+        self._paused_evt = threading.Event()
+        # 未暂停（或已停止）时置位，暂停中的播放线程等待它而不是轮询，继续播放时立即被唤醒
+        self._resume_evt = threading.Event()
         self.playing = False
         self.paused = False
         self.current_file = None
         self.play_thread = None
-        self._pressed_keys = set()
+        # 按键状态：每个按键一个编号，按下标记保存在 bytearray 中
+        self._key_names = list(dict.fromkeys(NOTE_TO_KEY.values()))
+        self._key_ids = {key: key_id for key_id, key in enumerate(self._key_names)}
+        # 每个按键预先拆分成 (修饰键, 基础键)，普通键的修饰键为 None，按键时不必再查找和拆分 '+'
+        self._key_parts = [tuple(key.split('+', 1)) if '+' in key else (None, key) for key in self._key_names]
+        self._pressed_mask = bytearray(len(self._key_names))
+        self._no_keys_pressed = bytes(len(self._key_names))
         
-        # 线程锁
+        # 按键发送：Windows 上用 SendInput 批量发送扫描码，不可用时使用 keyboard 库
+        self._key_sender = create_key_sender()
+        if self._key_sender:
+            try:
+                self._key_sender.prepare(NOTE_TO_KEY.values())
+            except Exception as e:
+                print(f"准备按键扫描码失败，改用 keyboard 库: {str(e)}")
+                self._key_sender = None
+        
+        # 播放线程中的输出先放入队列，由后台线程打印，避免控制台输出拖慢按键
+        self._log_q = deque(maxlen=256)
+        self._log_evt = threading.Event()
+        threading.Thread(target=self._log_loop, daemon=True).start()
+        self._debug = False  # 为 True 时输出每个按键和音符的调试信息（错误信息总是输出）
+        
+        # 线程锁（只用于同时修改多个状态字段的场合）
         self._lock = threading.Lock()
         
-        # 时间相关变量
+        # 时间相关变量（time.perf_counter_ns() 的纳秒数，整数运算不损失精度）
         self.start_time = 0
         self.pause_time = 0
         self.total_pause_time = 0
+        self._progress_origin = 0  # start_time + total_pause_time，当前进度 = 现在 - 该值
+        # (_progress_origin, pause_time, paused) 的快照，修改计时字段或暂停状态后整体替换，界面线程一次读取即可得到一致的值
+        self._time_state = (0, 0, False)
         self.total_time = 0
         
         # 音轨相关
@@ -67,17 +272,24 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
         
         # 目标窗口名称
         self.target_window_name = "燕云十六声"
+        # 播放线程固定运行的 CPU 编号，None 表示不固定（由系统调度）
+        self.playback_cpu = None
         
         # 窗口监控
-        self.window_check_interval = 0.2  # 增加到0.2秒
-        self.last_window_check = 0
-        self.last_window_state = False  # 缓存窗口状态
+        self.window_check_interval = 0.2  # 监控线程的检查间隔（秒），无法安装前台窗口钩子时使用
+        self.window_hook_exit_check = 0.5  # 使用钩子时，监控线程检查播放是否已停止的间隔（秒）
         self.auto_paused = False  # 标记是否因窗口切换而暂停
+        self._target_hwnd = None  # 最近一次切换到或确认过的目标窗口句柄
+        self._target_pid = 0  # 目标窗口所属进程，前台换成同一进程的其它窗口时也认为是目标窗口
+        self._window_active_evt = threading.Event()  # 由窗口监控线程维护，目标窗口在前台时置位
+        self._window_active_evt.set()
+        self._window_watch_id = 0  # 每次启动监控线程加一，旧的监控线程据此退出
         
         # 性能优化：缓存
-        self._note_key_cache = {}  # 缓存音符到按键的映射
-        self._weak_refs = weakref.WeakSet()  # 用于避免循环引用
-        self._cached_mid = None  # 缓存当前MIDI文件对象
+        self._event_schedule = ((), (), (), (), ())  # 预先计算好的音符事件数组 (绝对时间纳秒, 是否按下, 通道, 音符, 音轨下标)
+        self._preprocess_cache = {}  # (文件路径, 修改时间) -> _preprocess 的结果
+        self._active_indices = range(0)  # 所选音轨在事件数组中的下标（升序），随 set_track 重新生成
+        self._note_to_key_lut = [None] * 128  # 原始音符到按键的查找表，随 note_offset 生成
         
         # 性能优化：预计算的常量
         self.PLAYABLE_MIN = 36  # 最低音（C2）
@@ -92,6 +304,10 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
             (72, 83),  # 中高音区域 C5-B5
             (84, 96)   # 高音区域 C6-C7
         ]
+        # 预先算出每个调整后音高最近的可播放区域，下标为音高加 NEAREST_RANGE_BASE
+        self.NEAREST_RANGE_BASE = 128
+        self._nearest_range = [self._find_nearest_range(note)
+                               for note in range(-self.NEAREST_RANGE_BASE, 256)]
         
         # 添加备用窗口列表
         self.window_titles = [
@@ -99,6 +315,56 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
             "新建文本文档",  # 备用窗口1
         ]
         self.current_window_index = 0  # 当前使用的窗口索引
+        # 窗口标题匹配不区分大小写，目标标题预先转成小写
+        self._window_titles_lower = tuple(title.lower() for title in self.window_titles)
+
+    def _log(self, text):
+        """把输出加入打印队列（队列满时丢弃最早的内容）"""
+        self._log_q.append(text)
+        self._log_evt.set()
+
+    def _log_loop(self):
+        """后台打印线程"""
+        while True:
+            self._log_evt.wait()
+            self._log_evt.clear()
+            while self._log_q:
+                print(self._log_q.popleft())
+
+    @property
+    def playing(self):
+        """是否正在播放"""
+        return self._playing_evt.is_set()
+
+    @playing.setter
+    def playing(self, value):
+        if value:
+            self._playing_evt.set()
+        else:
+            self._playing_evt.clear()
+        self._update_resume_evt()
+        self._state_version += 1
+
+    @property
+    def paused(self):
+        """是否已暂停"""
+        return self._paused_evt.is_set()
+
+    @paused.setter
+    def paused(self, value):
+        if value:
+            self._paused_evt.set()
+        else:
+            self._paused_evt.clear()
+        self._update_resume_evt()
+        self._state_version += 1
+
+    def _update_resume_evt(self):
+        """只有在播放中且已暂停时才让等待继续的播放线程阻塞"""
+        if self._playing_evt.is_set() and self._paused_evt.is_set():
+            self._resume_evt.clear()
+        else:
+            self._resume_evt.set()
 
     def get_current_time(self):
         """获取当前播放时间（秒）"""
@@ -106,70 +372,47 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
             if not self.playing:
                 return 0
                 
-            with self._lock:
-                if self.paused:
-                    if self.pause_time:
-                        return (self.pause_time - self.start_time - self.total_pause_time) / 1000
-                    return 0
-                    
-                current = time.time() * 1000 - self.start_time - self.total_pause_time
-                # 确保不超过总时长
-                return min(current / 1000, self.total_time)
+            # 计时字段和暂停状态通过 _time_state 整体发布，读取一次快照就不会看到改了一半的值，不需要加锁
+            progress_origin, pause_time, paused = self._time_state
+            if pause_time:
+                return (pause_time - progress_origin) / 1e9
+            if paused:
+                return 0
+                
+            current = (time.perf_counter_ns() - progress_origin) / 1e9
+            # 确保不超过总时长
+            return min(current, self.total_time)
                 
         except Exception as e:
             print(f"获取当前时间时出错: {str(e)}")
             return 0
 
+    def _publish_time_state(self):
+        """计时字段或暂停状态修改完后调用（持有 _lock 时），一次替换整个快照"""
+        self._time_state = (self._progress_origin, self.pause_time, self._paused_evt.is_set())
+
     def get_total_time(self):
         """获取总时长（秒）"""
         return self.total_time
 
-    def _calculate_total_time(self, mid):
-        """计算MIDI文件总时长"""
-        try:
-            max_ticks = 0
-            current_ticks = 0
-            
-            # 获取基准tempo
-            base_tempo = 500000  # 默认值
-            for msg in mid.tracks[0]:
-                if msg.type == 'set_tempo':
-                    base_tempo = msg.tempo
-                    break
-            
-            # 计算最大tick数
-            for track in mid.tracks:
-                current_ticks = 0
-                for msg in track:
-                    current_ticks += msg.time
-                    max_ticks = max(max_ticks, current_ticks)
-            
-            # 使用原始tempo计算基础时长
-            seconds = (max_ticks * base_tempo) / (mid.ticks_per_beat * 1000000)
-            self.total_time = max(seconds, 0)  # 确保时长不为负
-            return self.total_time
-            
-        except Exception as e:
-            print(f"计算总时长时出错: {str(e)}")
-            self.total_time = 0
-            return 0
-
     def _press_key(self, key):
         """按下键位"""
         try:
-            if key not in self._pressed_keys:
-                print(f"按下键位: {key}")
-                if '+' in key:
-                    parts = key.split('+')
-                    modifier, base_key = parts[0], parts[1]
-                    keyboard.press(modifier)
-                    keyboard.press(base_key)
-                    self._pressed_keys.add(key)
+            key_id = self._key_ids[key]
+            if not self._pressed_mask[key_id]:
+                if self._debug:
+                    self._log(f"按下键位: {key}")
+                if self._key_sender:
+                    # 只加入待发送队列，由播放线程在等待下一个事件前统一发送
+                    self._key_sender.queue(key, True)
                 else:
-                    keyboard.press(key)
-                    self._pressed_keys.add(key)
+                    modifier, base_key = self._key_parts[key_id]
+                    if modifier is not None:
+                        keyboard.press(modifier)
+                    keyboard.press(base_key)
+                self._pressed_mask[key_id] = 1
         except Exception as e:
-            print(f"按键处理出错 {key}: {str(e)}")
+            self._log(f"按键处理出错 {key}: {str(e)}")
             # 确保出错时也释放按键
             try:
                 if '+' in key:
@@ -180,34 +423,48 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
                     keyboard.release(key)
             except:
                 pass
-            if key in self._pressed_keys:
-                self._pressed_keys.remove(key)
+            if key in self._key_ids:
+                self._pressed_mask[self._key_ids[key]] = 0
 
     def _release_key(self, key):
         """释放键位"""
         try:
-            if key in self._pressed_keys:
-                print(f"释放键位: {key}")
-                if '+' in key:
-                    parts = key.split('+')
-                    keyboard.release(parts[1])  # 先释放基础键
-                    keyboard.release(parts[0])  # 再释放修饰键
+            key_id = self._key_ids[key]
+            if self._pressed_mask[key_id]:
+                if self._debug:
+                    self._log(f"释放键位: {key}")
+                if self._key_sender:
+                    self._key_sender.queue(key, False)
                 else:
-                    keyboard.release(key)
-                self._pressed_keys.remove(key)
+                    modifier, base_key = self._key_parts[key_id]
+                    keyboard.release(base_key)  # 先释放基础键
+                    if modifier is not None:
+                        keyboard.release(modifier)  # 再释放修饰键
+                self._pressed_mask[key_id] = 0
         except Exception as e:
-            print(f"释放按键出错 {key}: {str(e)}")
-            # 确保出错时也从集合中移除
-            if key in self._pressed_keys:
-                self._pressed_keys.remove(key)
+            self._log(f"释放按键出错 {key}: {str(e)}")
+            # 确保出错时也清除按下标记
+            if key in self._key_ids:
+                self._pressed_mask[self._key_ids[key]] = 0
+
+    def _flush_keys(self):
+        """发送队列中等待的按键事件"""
+        if self._key_sender:
+            try:
+                self._key_sender.flush()
+            except Exception as e:
+                self._log(f"发送按键时出错: {str(e)}")
 
     def _release_all_keys(self):
         """释放所有按下的键位"""
         try:
-            # 创建按键列表的副本进行迭代
-            keys_to_release = list(self._pressed_keys)
-            for key in keys_to_release:
-                self._release_key(key)
+            # 用 find 在 C 中跳过未按下的按键，只处理按下标记为 1 的位置
+            pressed_mask = self._pressed_mask
+            key_id = pressed_mask.find(1)
+            while key_id != -1:
+                self._release_key(self._key_names[key_id])
+                key_id = pressed_mask.find(1, key_id + 1)
+            self._flush_keys()
             
             # 确保修饰键被释放
             try:
@@ -216,72 +473,129 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
             except Exception as e:
                 print(f"释放修饰键时出错: {str(e)}")
                 
-            self._pressed_keys.clear()
+            pressed_mask[:] = self._no_keys_pressed
         except Exception as e:
             print(f"释放所有按键时出错: {str(e)}")
-            # 强制清空按键集合
-            self._pressed_keys.clear()
+            # 强制清空按下标记
+            self._pressed_mask[:] = self._no_keys_pressed
 
     def analyze_tracks(self, mid):
-        """分析MIDI文件的音轨"""
+        """分析MIDI文件的音轨，返回含有音符的音轨的统计信息（不保存消息）"""
         try:
-            tracks_info = []
-
-            # 分析每条音轨，计算每个消息的绝对时间（毫秒），并考虑 tempo 变化
-            for track in mid.tracks:
-                messages = []
-
-                # 使用累计秒数来保存绝对时间（秒），并考虑 tempo 事件的影响
-                cumulative_seconds = 0.0
-                current_tempo = 350000  # 默认 tempo (microseconds per beat)
-
-                for msg in track:
-                    # msg.time 在 mido 中是 delta ticks
-                    delta_ticks = msg.time
-                    # 将 delta ticks 转换为秒，使用当前 tempo
-                    try:
-                        delta_seconds = mido.tick2second(delta_ticks, mid.ticks_per_beat, current_tempo)
-                    except Exception:
-                        # 兜底：如果转换失败，按原始 ticks/1000 近似
-                        delta_seconds = (delta_ticks / mid.ticks_per_beat) * (current_tempo / 1000000.0)
-
-                    cumulative_seconds += delta_seconds
-
-                    # 如果遇到 tempo 改变，影响后续消息的时间计算
-                    if msg.type == 'set_tempo' and hasattr(msg, 'tempo'):
-                        current_tempo = msg.tempo
+            return self._preprocess(mid)[0]
+        except Exception as e:
+            print(f"分析音轨时出错: {str(e)}")
+            return []
 
-                    if msg.type in ['note_on', 'note_off']:
-                        # 创建消息的副本，并设置绝对时间（毫秒）
-                        msg_copy = msg.copy()
-                        msg_copy.time = int(cumulative_seconds * 1000)
-                        messages.append(msg_copy)
+    def _load_preprocessed(self, midi_file):
+        """读取并预处理MIDI文件，返回 _preprocess 的结果；文件未修改过时直接使用上次的结果"""
+        try:
+            key = (midi_file, os.path.getmtime(midi_file))
+        except OSError:
+            key = None
+        
+        cached = self._preprocess_cache.get(key) if key is not None else None
+        if cached is not None:
+            return cached
+        
+        result = self._preprocess(load_midi_file(midi_file))
+        if key is not None:
+            self._preprocess_cache[key] = result
+            if len(self._preprocess_cache) > PREPROCESS_CACHE_SIZE:
+                # 移除最早缓存的结果
+                del self._preprocess_cache[next(iter(self._preprocess_cache))]
+        return result
 
-                if messages:
-                    tracks_info.append({
-                        'messages': messages,
-                        'channel': None
-                    })
+    def _preprocess(self, mid):
+        """一次遍历所有消息，同时得到音轨信息、总时长和音符事件时间表
 
-            return tracks_info
+        返回 (tracks_info, total_time, schedule)。schedule 为五个等长的数组
+        (绝对时间纳秒, 是否按下, 通道, 音符, 音轨下标)，时间按全局速度变化换算，
+        比每个事件一个元组占用的内存小得多。
+        """
+        # 只取出音符和速度变化，音符先记录绝对tick，其它消息直接跳过
+        notes = []
+        add_note = notes.append  # 每个音符都要调用，绑定到局部变量
+        tempo_changes = []
+        tracks_info = []
+        max_ticks = 0
+        base_tempo = 500000  # 总时长按第一条音轨中的第一个 tempo 计算（没有则为默认值）
+        for track_index, track in enumerate(mid.tracks):
+            tick = 0
+            has_notes = False
+            notes_count = 0
+            for msg in track:
+                tick += msg.time
+                msg_type = msg.type
+                if msg_type == 'note_on':
+                    has_notes = True
+                    if msg.velocity > 0:
+                        notes_count += 1
+                        add_note((tick, True, msg.channel, msg.note, track_index))
+                elif msg_type == 'note_off':
+                    has_notes = True
+                    add_note((tick, False, msg.channel, msg.note, track_index))
+                elif msg_type == 'set_tempo':
+                    tempo_changes.append((tick, msg.tempo))
             
-        except Exception as e:
-            print(f"分析音轨时出错: {str(e)}")
-            return []
+            if has_notes:
+                tracks_info.append({
+                    'track': track_index,  # 在 mid.tracks 中的下标
+                    'channel': None,
+                    'notes_count': notes_count
+                })
+            # 增量时间非负，音轨最后的绝对tick就是它的总tick数
+            max_ticks = max(max_ticks, tick)
+            # 排序前 tempo_changes 按音轨顺序排列，第一条音轨的第一个 tempo 就在最前面
+            if track_index == 0 and tempo_changes:
+                base_tempo = tempo_changes[0][1]
+        
+        ticks_per_beat = mid.ticks_per_beat
+        total_time = max((max_ticks * base_tempo) / (ticks_per_beat * 1000000), 0)
+        
+        # 稳定排序，同一时刻的顺序与 mido.merge_tracks 一致
+        notes.sort(key=itemgetter(0))
+        tempo_changes.sort(key=itemgetter(0))
+        
+        times = array('q')
+        presses = array('B')
+        channels = array('B')
+        note_numbers = array('B')
+        tracks = array('H')
+        # 每段速度内时间与tick成正比：记录该段起点的时间和tick，音符时间 = 起点时间 + tick差 × 每tick纳秒数
+        segment_time = 0.0
+        segment_tick = 0
+        ns_per_tick = 500000 * 1000 / ticks_per_beat  # 默认 tempo 500000 (microseconds per beat)
+        tempo_changes.append((float('inf'), None))  # 哨兵，省去每个音符检查下标是否越界
+        tempo_index = 0
+        next_change_tick = tempo_changes[0][0]
+        # 速度变化对之后所有音轨的音符生效
+        for tick, is_press, channel, note, track_index in notes:
+            while next_change_tick <= tick:
+                segment_time += (next_change_tick - segment_tick) * ns_per_tick
+                segment_tick = next_change_tick
+                ns_per_tick = tempo_changes[tempo_index][1] * 1000 / ticks_per_beat
+                tempo_index += 1
+                next_change_tick = tempo_changes[tempo_index][0]
+            times.append(round(segment_time + (tick - segment_tick) * ns_per_tick))
+            presses.append(is_press)
+            channels.append(channel)
+            note_numbers.append(note)
+            tracks.append(track_index)
+        return tracks_info, total_time, (times, presses, channels, note_numbers, tracks)
+
+    def _build_note_lut(self):
+        """按当前的 note_offset 预先算出每个原始音符对应的按键，没有对应按键的为 None"""
+        lut = [None] * 128
+        for raw_note in range(128):
+            lut[raw_note] = NOTE_TO_KEY.get(self._adjust_note(raw_note))
+        self._note_to_key_lut = lut
+        return lut
 
     def _decode_track_name(self, name):
         """解码音轨名称"""
         if isinstance(name, bytes):
-            # 尝试不同的编码方式
-            encodings = ['utf-8', 'gbk', 'gb2312', 'shift-jis', 'ascii']
-            for encoding in encodings:
-                try:
-                    decoded = name.decode(encoding)
-                    # 如果成功解码并且结果看起来是有效的
-                    if decoded and not any(ord(c) < 32 for c in decoded):
-                        return decoded
-                except UnicodeDecodeError:  # 替换裸异常为具体异常类型
-                    continue
+            return decode_track_name_bytes(name)
         elif isinstance(name, str):
             return name
         return None
@@ -328,6 +642,16 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
     def set_track(self, channel):
         """设置要播放的音轨"""
         self.selected_track = channel
+        # 选择音轨时就筛选好要发送的事件，播放线程不必逐个事件比较通道
+        self._active_indices = self._build_active_indices(channel)
+        self._state_version += 1
+
+    def _build_active_indices(self, channel):
+        """返回事件数组中属于指定通道的事件下标（升序），channel 为 None 时为全部事件"""
+        channels = self._event_schedule[2]
+        if channel is None:
+            return range(len(channels))
+        return array('L', [index for index, event_channel in enumerate(channels) if event_channel == channel])
 
     def _find_game_window(self):
         """查找游戏窗口"""
@@ -343,11 +667,29 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
     def _switch_to_game_window(self):
         """切换到游戏窗口，使用模糊匹配"""
         try:
-            def enum_windows_callback(hwnd, window_list):
+            # 上次切换到的窗口仍然存在且标题仍匹配当前选择时，直接切换，不必枚举所有窗口
+            current_title = self.window_titles[self.current_window_index]
+            hwnd = self._target_hwnd
+            if hwnd and self._win32gui.IsWindow(hwnd):
                 title = self._win32gui.GetWindowText(hwnd)
+                if self._window_titles_lower[self.current_window_index] in title.lower():
+                    try:
+                        self._win32gui.SetForegroundWindow(hwnd)
+                        self.target_window_name = title
+                        self._window_active_evt.set()
+                        return True
+                    except Exception as e:
+                        print(f"切换到窗口 {title} 失败: {str(e)}")
+            
+            window_titles = list(zip(self.window_titles, self._window_titles_lower))
+            get_window_text = self._win32gui.GetWindowText  # 每个顶层窗口都要调用一次
+            
+            def enum_windows_callback(hwnd, window_list):
+                title = get_window_text(hwnd)
+                title_lower = title.lower()
                 # 对每个目标标题进行模糊匹配
-                for target_title in self.window_titles:
-                    if target_title.lower() in title.lower():
+                for target_title, target_lower in window_titles:
+                    if target_lower in title_lower:
                         window_list.append((hwnd, title, target_title))
                 return True
                 
@@ -361,12 +703,14 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
                 return False
                 
             # 尝试切换到当前选择的窗口
-            current_title = self.window_titles[self.current_window_index]
             for hwnd, title, matched_title in window_list:
                 if matched_title == current_title:
                     try:
                         self._win32gui.SetForegroundWindow(hwnd)
                         self.target_window_name = title  # 更新为实际的窗口标题
+                        self._target_hwnd = hwnd
+                        self._target_pid = get_window_pid(hwnd)
+                        self._window_active_evt.set()
                         return True
                     except Exception as e:
                         print(f"切换到窗口 {title} 失败: {str(e)}")
@@ -377,6 +721,9 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
                     self._win32gui.SetForegroundWindow(hwnd)
                     self.current_window_index = self.window_titles.index(matched_title)
                     self.target_window_name = title
+                    self._target_hwnd = hwnd
+                    self._target_pid = get_window_pid(hwnd)
+                    self._window_active_evt.set()
                     return True
                 except Exception as e:
                     print(f"切换到窗口 {title} 失败: {str(e)}")
@@ -405,12 +752,9 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
             self.stop()
             
             try:
-                # 加载并缓存MIDI文件
-                mid = mido.MidiFile(midi_file)
-                
-                # 预计算总时长和分析音轨
-                total_time = self._calculate_total_time(mid)
-                tracks_info = self.analyze_tracks(mid)
+                # 加载MIDI文件，一次遍历得到总时长、音轨信息和音符事件（文件未修改时使用缓存）
+                tracks_info, total_time, events = self._load_preprocessed(midi_file)
+                self._build_note_lut()
                 
                 # 尝试切换到游戏窗口
                 if not self._switch_to_game_window():
@@ -420,14 +764,19 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
                 # 设置新的播放状态
                 with self._lock:
                     self.current_file = midi_file
-                    self._cached_mid = mid  # 在设置其他状态之前缓存MIDI文件
+                    self._event_schedule = events  # 在设置其他状态之前准备好事件
+                    self._active_indices = self._build_active_indices(self.selected_track)
                     self.total_time = total_time
                     self.tracks_info = tracks_info
                     self.playing = True
                     self.paused = False
-                    self.start_time = time.time() * 1000
+                    self.start_time = time.perf_counter_ns()
                     self.total_pause_time = 0
+                    self.pause_time = 0
+                    self._progress_origin = self.start_time
+                    self._publish_time_state()
                     
+                self._start_window_watcher()
                 self.play_thread = threading.Thread(target=self._play_thread)
                 self.play_thread.daemon = True
                 self.play_thread.start()
@@ -442,86 +791,114 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
             self.stop()
 
     def _play_thread(self):
-        """MIDI播放线程"""
+        """MIDI播放线程：按预先计算的事件时间表发送按键"""
+        set_timer_resolution(True)
+        task_handle = raise_thread_priority()
+        old_affinity = pin_thread_to_cpu(self.playback_cpu)
         try:
-            if not self._cached_mid:
-                print("未找到缓存的MIDI文件")
+            times, presses, _channels, notes, _tracks = self._event_schedule
+            note_to_key = self._note_to_key_lut
+            if not times:
+                self._log("没有可播放的音符事件")
                 return
-                
-            last_pause_check = time.time()
             
-            # 获取播放状态的本地副本
-            with self._lock:
-                is_playing = self.playing
-                is_paused = self.paused
-                selected_track = self.selected_track
+            # 以单调时钟为基准，暂停的时长会累加到 start 上，使后续事件整体顺延
+            start = time.perf_counter_ns()
+            is_playing = self._playing_evt.is_set
+            is_paused = self._paused_evt.is_set
+            is_window_active = self._window_active_evt.is_set
+            wait_resumed = self._resume_evt.wait
+            flush_keys = self._flush_keys
+            # 循环中每个事件都要用到的方法先绑定到局部变量
+            perf_counter_ns = time.perf_counter_ns
+            sleep = time.sleep
+            press_key = self._press_key
+            release_key = self._release_key
+            seen_version = self._state_version
+            indices = self._active_indices
+            position = 0
             
-            # 使用缓存的MIDI文件
-            for msg in self._cached_mid.play(meta_messages=True):
-                # 快速检查播放状态
-                with self._lock:
-                    is_playing = self.playing
-                    is_paused = self.paused
-                    if not is_playing:
+            while position < len(indices):
+                index = indices[position]
+                event_time = times[index]
+                # 等待到事件时间，等待期间仍定期检查窗口和暂停状态
+                while True:
+                    if not is_playing():
                         break
-                
-                # 检查窗口状态并处理暂停
-                current_time = time.time()
-                if current_time - last_pause_check >= 0.1:
-                    # 检查窗口状态
-                    if not self._check_active_window():
-                        if not self.auto_paused and not is_paused:
-                            print("窗口切换，自动暂停播放")
+                    
+                    now = perf_counter_ns()
+                    # 窗口状态由监控线程更新，这里只读取标志
+                    if not is_window_active():
+                        if not self.auto_paused and not is_paused():
+                            self._log("窗口切换，自动暂停播放")
+                            # 只有同时修改多个字段（含进度计时）时才加锁，平时的状态读取都不加锁
                             with self._lock:
                                 self.paused = True
                                 self.auto_paused = True
-                            is_paused = True
-                    elif self.auto_paused and is_paused:
-                        print("窗口恢复，继续播放")
+                                self.pause_time = now
+                                self._publish_time_state()
+                    elif self.auto_paused and is_paused():
+                        self._log("窗口恢复，继续播放")
                         with self._lock:
                             self.paused = False
                             self.auto_paused = False
-                        is_paused = False
-                    
-                    # 更新状态
-                    with self._lock:
-                        is_playing = self.playing
-                        is_paused = self.paused
-                        selected_track = self.selected_track
-                        if self.pause_time:
-                            pause_duration = current_time * 1000 - self.pause_time
-                            self.total_pause_time += pause_duration
+                            if self.pause_time:
+                                self.total_pause_time += now - self.pause_time
+                                self._progress_origin = self.start_time + self.total_pause_time
                             self.pause_time = 0
+                            self._publish_time_state()
+                    
+                    # 处理暂停：暂停多久，时间表就顺延多久。
+                    # 手动继续或停止时立即唤醒；自动暂停时仍每 0.1 秒回来检查窗口是否恢复
+                    if is_paused():
+                        wait_resumed(0.1)
+                        start += perf_counter_ns() - now
+                        continue
                     
-                    last_pause_check = current_time
+                    delay = start + event_time - now
+                    if delay <= CHORD_WINDOW_NS:
+                        break
+                    # 同一和弦的按键事件已全部加入队列，一次发送
+                    flush_keys()
+                    if delay > SPIN_THRESHOLD_NS:
+                        sleep(min(delay - SPIN_THRESHOLD_NS, MAX_SLEEP_SLICE_NS) / 1e9)
+                    else:
+                        sleep(0)  # 临近事件时间，让出时间片后再检查
                 
-                # 处理暂停
-                if is_paused:
-                    time.sleep(0.1)
-                    continue
+                if not is_playing():
+                    break
                 
-                # 处理音符消息
-                if msg.type == 'note_on' and hasattr(msg, 'channel'):
-                    if selected_track is None or msg.channel == selected_track:
-                        note = self._adjust_note(msg.note)
-                        if note in NOTE_TO_KEY:
-                            if msg.velocity > 0:
-                                self._press_key(NOTE_TO_KEY[note])
-                elif msg.type == 'note_off' and hasattr(msg, 'channel'):
-                    if selected_track is None or msg.channel == selected_track:
-                        note = self._adjust_note(msg.note)
-                        if note in NOTE_TO_KEY:
-                            self._release_key(NOTE_TO_KEY[note])
+                # 状态有变化时才检查所选音轨是否改变；改变后从新下标列表中
+                # 不早于当前事件的位置继续（二分查找）
+                version = self._state_version
+                if version != seen_version:
+                    seen_version = version
+                    if self._active_indices is not indices:
+                        indices = self._active_indices
+                        position = bisect_left(indices, index)
+                        continue
                 
-                if not is_playing:
-                    break
+                # 处理音符事件
+                key = note_to_key[notes[index]]
+                if key is not None:
+                    if presses[index]:
+                        press_key(key)
+                    else:
+                        release_key(key)
+                position += 1
+            
+            flush_keys()
             
             # 播放结束后清理
             self.stop()
             
         except Exception as e:
-            print(f"播放时出错: {str(e)}")
+            self._log(f"播放时出错: {str(e)}")
             self.stop()
+        finally:
+            restore_thread_affinity(old_affinity)
+            restore_thread_priority(task_handle)
+            set_timer_resolution(False)
 
     def pause(self):
         """统一的暂停处理"""
@@ -531,7 +908,8 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
                 self.paused = not was_paused
                 
                 if self.paused:  # 暂停播放
-                    self.pause_time = time.time() * 1000
+                    self.pause_time = time.perf_counter_ns()
+                    self._publish_time_state()
                     self._release_all_keys()  # 确保释放所有按键
                     print("暂停播放")
                 else:  # 继续播放
@@ -539,11 +917,14 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
                     if not self._switch_to_game_window():
                         print("无法切换到目标窗口，保持暂停状态")
                         self.paused = True
+                        self._publish_time_state()
                         return False
                     
                     if self.pause_time:
-                        self.total_pause_time += time.time() * 1000 - self.pause_time
+                        self.total_pause_time += time.perf_counter_ns() - self.pause_time
+                        self._progress_origin = self.start_time + self.total_pause_time
                     self.pause_time = 0
+                    self._publish_time_state()
                     print("继续播放")
                 
                 return True
@@ -564,8 +945,10 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
                 
                 self.paused = False
                 if self.pause_time:
-                    self.total_pause_time += time.time() * 1000 - self.pause_time
+                    self.total_pause_time += time.perf_counter_ns() - self.pause_time
+                    self._progress_origin = self.start_time + self.total_pause_time
                 self.pause_time = 0
+                self._publish_time_state()
                 self.auto_paused = False
                 return True
             
@@ -579,35 +962,43 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
             self.playing = False
             self.paused = False
             self.auto_paused = False
+            self._publish_time_state()
             self.current_file = None
             self._release_all_keys()
             print("停止播放")
+            if self._key_sender:
+                failed = self._key_sender.take_failed_count()
+                if failed:
+                    print(f"发送按键失败: 共有 {failed} 个按键事件未能发送")
+
+    def _find_nearest_range(self, note):
+        """找到中心离音符最近的可播放区域（距离相同时取靠前的区域）"""
+        best_range = None
+        min_distance = float('inf')
+        
+        for note_range in self.NOTE_RANGES:
+            range_center = (note_range[0] + note_range[1]) / 2
+            distance = abs(note - range_center)
+            if distance < min_distance:
+                min_distance = distance
+                best_range = note_range
+        return best_range
 
     def _adjust_note(self, note):
         """智能调整音符音高，尽量保持原始音乐的相对关系"""
         try:
-            # 使用缓存
-            cache_key = (note, self.note_offset)
-            if cache_key in self._note_key_cache:
-                return self._note_key_cache[cache_key]
-
             adjusted_note = note + self.note_offset
 
             # 如果音符已经在可播放范围内，直接返回
             if self.PLAYABLE_MIN <= adjusted_note <= self.PLAYABLE_MAX:
-                self._note_key_cache[cache_key] = adjusted_note
                 return adjusted_note
 
             # 找到最近的可播放区域
-            best_range = None
-            min_distance = float('inf')
-            
-            for note_range in self.NOTE_RANGES:
-                range_center = (note_range[0] + note_range[1]) / 2
-                distance = abs(adjusted_note - range_center)
-                if distance < min_distance:
-                    min_distance = distance
-                    best_range = note_range
+            index = adjusted_note + self.NEAREST_RANGE_BASE
+            if 0 <= index < len(self._nearest_range):
+                best_range = self._nearest_range[index]
+            else:
+                best_range = self._find_nearest_range(adjusted_note)
 
             # 将音符映射到最近的可播放区域
             if best_range:
@@ -618,30 +1009,71 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
 
                 # 确保音符在可播放范围内
                 adjusted_note = max(self.PLAYABLE_MIN, min(adjusted_note, self.PLAYABLE_MAX))
-                
-                # 缓存结果
-                self._note_key_cache[cache_key] = adjusted_note
                 return adjusted_note
 
             # 如果无法调整，返回原始音符
             return note
 
         except Exception as e:
-            print(f"调整音符时出错: {str(e)}")
+            self._log(f"调整音符时出错: {str(e)}")
             return note
 
+    def _start_window_watcher(self):
+        """启动窗口监控线程，播放停止后自动退出"""
+        self._window_watch_id += 1
+        self._window_active_evt.set()
+        watcher = threading.Thread(target=self._window_watcher_loop,
+                                   args=(self._window_watch_id,), daemon=True)
+        watcher.start()
+
+    def _window_watcher_loop(self, watch_id):
+        """检查目标窗口是否在前台，结果保存在 _window_active_evt 中供播放线程读取
+
+        优先用前台窗口钩子，只在窗口切换时检查；钩子不可用时定期检查。
+        """
+        def keep_watching():
+            return self._window_watch_id == watch_id and self._playing_evt.is_set()
+
+        def update(hwnd=None):
+            if not keep_watching():
+                return
+            if self._check_active_window():
+                self._window_active_evt.set()
+            else:
+                self._window_active_evt.clear()
+
+        hook = create_foreground_hook(update)
+        if hook:
+            update()  # 钩子只通知之后的切换，先检查一次当前状态
+            hook.run(keep_watching, self.window_hook_exit_check)
+            return
+
+        while keep_watching():
+            update()
+            time.sleep(self.window_check_interval)
+
     def _check_active_window(self):
         """检查目标窗口是否处于活动状态"""
         try:
-            if not self._win32gui:
+            win32gui = self._win32gui
+            if not win32gui:
+                return True
+            
+            active_window = win32gui.GetForegroundWindow()
+            # 前台仍是已知的目标窗口时直接比较句柄，不必读取窗口标题
+            if active_window and active_window == self._target_hwnd:
+                return True
+            # 其次比较所属进程（如游戏自己的弹出窗口），GetWindowText 要向窗口发送消息，开销大得多
+            if self._target_pid and get_window_pid(active_window) == self._target_pid:
                 return True
             
-            active_window = self._win32gui.GetForegroundWindow()
-            active_title = self._win32gui.GetWindowText(active_window).lower()
+            active_title = win32gui.GetWindowText(active_window).lower()
             
             # 检查当前活动窗口是否匹配任何目标窗口
-            for title in self.window_titles:
-                if title.lower() in active_title:
+            for title in self._window_titles_lower:
+                if title in active_title:
+                    self._target_hwnd = active_window
+                    self._target_pid = get_window_pid(active_window)
                     return True
             
             return False
@@ -650,72 +1082,145 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
             print(f"检查窗口状态时出错: {str(e)}")
             return True  # 出错时默认返回True以避免意外暂停
 
-    def play_track(self, track_info):
-        """播放单个音轨"""
+    def play_track(self, notes):
+        """按 (绝对时间纳秒, 原始音符) 列表依次点按对应的键，同时发声的音符一起点按"""
+        set_timer_resolution(True)
+        task_handle = raise_thread_priority()
+        old_affinity = pin_thread_to_cpu(self.playback_cpu)
         try:
-            last_pause_check = time.time()
-            last_time = 0
-            
-            print("\n开始播放音轨:")
-            print(f"消息总数: {len(track_info['messages'])}")
+            self._log("\n开始播放音轨:")
+            self._log(f"消息总数: {len(notes)}")
             
             # 确保切换到目标窗口
             if not self._switch_to_game_window():
-                print("无法切换到目标窗口，暂停播放")
+                self._log("无法切换到目标窗口，暂停播放")
                 self.pause()
                 return
             
-            for msg in track_info['messages']:
-                if not self.playing:
+            is_playing = self._playing_evt.is_set
+            is_paused = self._paused_evt.is_set
+            wait_resumed = self._resume_evt.wait
+            
+            # 按绝对时间等待每个音符，暂停的时长累加到 start 上
+            start = time.perf_counter_ns()
+            is_window_active = self._window_active_evt.is_set
+            self._start_window_watcher()
+            
+            # 和弦由生产者线程准备好放入队列，本线程只负责等待时间点和发送按键
+            chord_queue = deque()
+            producer = threading.Thread(target=self._produce_chords,
+                                        args=(notes, chord_queue), daemon=True)
+            producer.start()
+            
+            while is_playing():
+                try:
+                    chord = chord_queue.popleft()
+                except IndexError:
+                    # 生产者还没跟上，稍等再取
+                    time.sleep(0.001)
+                    continue
+                if chord is None:  # 全部和弦已播放
+                    break
+                event_time, plain_keys, combo_keys, raw_notes = chord
+                # 等待到音符的时间点，长时间的休止期间停止播放时立即退出
+                if not sleep_until_ns(start + event_time, is_playing):
                     break
-                    
-                # 计算相对时间并处理延时
-                relative_time = msg.time - last_time if hasattr(msg, 'time') else 0
-                if relative_time > 0:
-                    time.sleep(relative_time / 1000)
-                last_time = msg.time if hasattr(msg, 'time') else last_time
                 
-                # 定期检查窗口状态
-                current_time = time.time()
-                if current_time - last_pause_check >= self.window_check_interval:
-                    window_active = self._check_active_window()
-                    last_pause_check = current_time
-                    
-                    if not window_active and not self.paused:
-                        print("\n目标窗口失去焦点，自动暂停")
+                # 窗口状态由监控线程更新
+                if not is_window_active() and not is_paused():
+                    self._log("\n目标窗口失去焦点，自动暂停")
+                    # 与 _play_thread 相同，直接修改暂停状态，不在循环中经由 pause() 直接打印
+                    with self._lock:
+                        self.paused = True
                         self.auto_paused = True
-                        self.pause()  # 使用统一的暂停处理
-                        continue
+                        self.pause_time = time.perf_counter_ns()
+                        self._publish_time_state()
+                    continue
                 
                 # 处理暂停状态
-                while self.paused:
-                    time.sleep(0.1)
-                    if not self.playing:  # 如果在暂停时停止播放
+                pause_start = time.perf_counter_ns()
+                while is_paused():
+                    # 继续播放或停止播放时立即被唤醒（两者都经过 paused/playing 的 setter 置位事件），
+                    # 暂停期间线程不再定时醒来
+                    wait_resumed()
+                    if not is_playing():  # 如果在暂停时停止播放
                         break
-                    continue
+                start += time.perf_counter_ns() - pause_start
 
-                if not self.playing:
+                if not is_playing():
                     break
 
-                # 处理音符消息
-                if msg.type == 'note_on' and msg.velocity > 0:
-                    if track_info.get('channel') is None or msg.channel == track_info['channel']:
-                        note = self._adjust_note(msg.note)
-                        if note in NOTE_TO_KEY:
-                            key = NOTE_TO_KEY[note]
-                            print(f"音符信息: {msg.note}(原始) -> {note}(调整后) -> {key}(按键)")
-                            keyboard.press(key)
-                            time.sleep(0.0001)
-                            keyboard.release(key)
+                # 点按音符对应的键
+                if self._debug:
+                    # 调试信息只在开启时才从查找表换算，平时不为每个和弦生成映射列表
+                    note_to_key = self._note_to_key_lut
+                    for raw_note in raw_notes:
+                        key = note_to_key[raw_note]
+                        if key is not None:
+                            self._log(f"音符信息: {raw_note}(原始) -> {key}(按键)")
+                self._tap_keys(plain_keys, combo_keys)
                 
-            print("\n音轨播放完成")
+            self._log("\n音轨播放完成")
             
         except Exception as e:
-            print(f"\n播放音轨时出错: {str(e)}")
+            self._log(f"\n播放音轨时出错: {str(e)}")
             import traceback
             traceback.print_exc()
         finally:
             self._release_all_keys()
+            restore_thread_affinity(old_affinity)
+            restore_thread_priority(task_handle)
+            set_timer_resolution(False)
+
+    def _produce_chords(self, notes, chord_queue):
+        """生产者线程：把音符合并成和弦并换算成按键，依次放入队列，最后放入 None 表示结束
+
+        队列中的每项为 (时间, 普通键列表, 组合键列表, [原始音符...])，
+        按键在这里就按是否带修饰键分好，没有对应按键的和弦直接跳过。
+        队列满时等待播放线程取走，停止播放后直接退出。
+        """
+        note_to_key = self._note_to_key_lut
+        is_playing = self._playing_evt.is_set
+        for event_time, raw_notes in group_chords(notes):
+            # 同一和弦里重复的键只按一次
+            keys = []
+            for raw_note in raw_notes:
+                key = note_to_key[raw_note]
+                if key is not None and key not in keys:
+                    keys.append(key)
+            if not keys:
+                continue
+            plain_keys = [key for key in keys if '+' not in key]
+            combo_keys = [key for key in keys if '+' in key]
+            
+            while len(chord_queue) >= CHORD_QUEUE_SIZE:
+                if not is_playing():
+                    return
+                time.sleep(0.01)
+            chord_queue.append((event_time, plain_keys, combo_keys, raw_notes))
+        chord_queue.append(None)
+
+    def _tap_keys(self, plain_keys, combo_keys):
+        """点按一组同时发声的键：不带修饰键的键一起按下再一起松开，
+        组合键在普通键松开之后逐个完整点按，避免修饰键作用到同一批的其它键上"""
+        if not self._key_sender:
+            for key in plain_keys + combo_keys:
+                keyboard.press(key)
+                time.sleep(0.0001)
+                keyboard.release(key)
+            return
+        
+        if not plain_keys:
+            if len(combo_keys) == 1:
+                # 组合键的四个事件预先填好，一次 SendInput 完成点按
+                self._key_sender.tap(combo_keys[0])
+            else:
+                self._key_sender.release_and_tap((), combo_keys)
+            return
+        self._key_sender.press(*plain_keys)
+        time.sleep(0.0001)
+        # 松开普通键和点按组合键放在同一次 SendInput 中，整个和弦最多两次系统调用
+        self._key_sender.release_and_tap(plain_keys, combo_keys)
 
     def play_midi(self, midi_file, track_index=None):
         """播放MIDI文件"""
@@ -729,20 +1234,23 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
                 self.playing = True
                 self.paused = False
                 self.current_file = midi_file
-                self.start_time = time.time() * 1000
+                self.start_time = time.perf_counter_ns()
                 self.pause_time = 0
                 self.total_pause_time = 0
+                self._progress_origin = self.start_time
+                self._publish_time_state()
             
-            # 分析MIDI文件
-            mid = mido.MidiFile(midi_file)
-            self._calculate_total_time(mid)  # 计算总时长
-            tracks_info = self.analyze_tracks(mid)
+            # 分析MIDI文件，一次遍历得到音轨信息、总时长和音符事件（文件未修改时使用缓存）
+            tracks_info, self.total_time, schedule = self._load_preprocessed(midi_file)
             
             if not tracks_info:
                 print("没有找到可播放的音轨")
                 self.stop()
                 return
             
+            times, presses, _channels, note_numbers, tracks = schedule
+            self._build_note_lut()
+            
             # 确保窗口处于活动状态
             if not self._switch_to_game_window():
                 print("无法切换到游戏窗口，停止播放")
@@ -751,9 +1259,6 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
             
             # 选择要播放的音轨
             try:
-                # 将所有音轨的消息按时间顺序合并
-                merged_messages = []
-                
                 # 修正：确保 track_index 是有效的整数
                 if track_index is not None:
                     try:
@@ -765,33 +1270,25 @@ class MidiPlayer(QObject):  # 继承QObject以支持信号
                 
                 if track_index is None or track_index <= 0:  # 播放所有音轨
                     print("播放所有音轨")
-                    for track in tracks_info:
-                        merged_messages.extend(track['messages'])
+                    notes = [(event_time, note) for event_time, is_press, note
+                             in zip(times, presses, note_numbers) if is_press]
                 elif track_index <= len(tracks_info):  # 播放指定音轨
                     print(f"播放音轨 {track_index}")
-                    merged_messages = tracks_info[track_index - 1]['messages']
+                    selected = tracks_info[track_index - 1]['track']
+                    notes = [(event_time, note) for event_time, is_press, note, track
+                             in zip(times, presses, note_numbers, tracks) if is_press and track == selected]
                 else:
                     print(f"无效的音轨索引: {track_index}，音轨数量: {len(tracks_info)}")
                     self.stop()
                     return
                 
-                if not merged_messages:
+                if not notes:
                     print("没有可播放的消息")
                     self.stop()
                     return
-                    
-                # 按时间顺序排序所有消息
-                merged_messages.sort(key=lambda x: x.time)
-                print(f"总消息数: {len(merged_messages)}")
-                
-                # 创建一个包含所有消息的单一音轨信息
-                merged_track = {
-                    'messages': merged_messages,
-                    'channel': None  # 允许所有通道
-                }
                 
-                # 播放合并后的音轨
-                self.play_track(merged_track)
+                # 事件已按时间排序，直接播放
+                self.play_track(notes)
                 
             except Exception as e:
                 print(f"播放音轨时出错: {str(e)}")
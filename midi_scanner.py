@@ -0,0 +1,143 @@
+"""
+MIDI音轨扫描 - 直接读取标准MIDI文件的二进制数据，统计每条音轨的音符信息。
+不创建 mido 的消息对象，用于选择歌曲时快速生成音轨列表。
+"""
+
+import struct
+
+# 与 mido 一致：单条消息数据的最大长度
+MAX_MESSAGE_LENGTH = 1000000
+
+# 通道消息（按状态字节高4位）后面跟随的数据字节数
+CHANNEL_DATA_LENGTHS = {
+    0x80: 2,  # note_off
+    0x90: 2,  # note_on
+    0xA0: 2,  # polytouch
+    0xB0: 2,  # control_change
+    0xC0: 1,  # program_change
+    0xD0: 1,  # aftertouch
+    0xE0: 2,  # pitchwheel
+}
+
+# 系统消息后面跟随的数据字节数（sysex 和 meta 单独处理）
+SYSTEM_DATA_LENGTHS = {
+    0xF1: 1, 0xF2: 2, 0xF3: 1, 0xF6: 0,
+    0xF8: 0, 0xFA: 0, 0xFB: 0, 0xFC: 0, 0xFE: 0,
+}
+
+def scan_tracks(path):
+    """扫描MIDI文件，返回每条音轨的统计信息列表
+
+    每条音轨为 {'hist': 128格音符直方图, 'velocity_sum': 力度总和,
+    'has_notes': 是否含有音符消息, 'channel': 最后一条消息的通道}，
+    只统计力度大于0的 note_on。文件损坏时与 mido 一样抛出 EOFError 或 OSError。
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    return scan_midi_bytes(data)
+
+def scan_midi_bytes(data):
+    """扫描内存中的MIDI文件数据"""
+    if len(data) < 8:
+        raise EOFError
+    name, size = struct.unpack_from('>4sL', data, 0)
+    if name != b'MThd':
+        raise OSError('MThd not found. Probably not a MIDI file')
+    if size < 6 or len(data) < 8 + size:
+        raise EOFError
+    num_tracks = struct.unpack_from('>h', data, 10)[0]
+
+    pos = 8 + size
+    tracks = []
+    for _ in range(num_tracks):
+        if len(data) < pos + 8:
+            raise EOFError
+        name, size = struct.unpack_from('>4sL', data, pos)
+        if name != b'MTrk':
+            raise OSError('no MTrk header at start of track')
+        pos += 8
+        tracks.append(_scan_track(data, pos, pos + size))
+        pos += size
+    return tracks
+
+def _read_variable_int(data, pos):
+    """读取变长整数，返回 (数值, 新位置)"""
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, pos
+
+def _scan_track(data, pos, end):
+    """扫描一条音轨的数据块"""
+    if end > len(data):
+        raise EOFError
+
+    hist = [0] * 128
+    velocity_sum = 0
+    has_notes = False
+    channel = 0
+    last_status = None
+
+    try:
+        while pos < end:
+            # 跳过增量时间
+            while data[pos] & 0x80:
+                pos += 1
+            pos += 1
+
+            status = data[pos]
+            pos += 1
+            if status < 0x80:
+                # 沿用上一条消息的状态字节，当前字节即为第一个数据字节
+                if last_status is None:
+                    raise OSError('running status without last_status')
+                status = last_status
+                pos -= 1
+            elif status != 0xFF:
+                # meta 消息不影响 running status
+                last_status = status
+
+            if status < 0xF0:
+                kind = status & 0xF0
+                channel = status & 0x0F
+                if kind == 0x90 or kind == 0x80:
+                    has_notes = True
+                    if kind == 0x90:
+                        # 超出范围的数据字节截断到127（与 clip=True 一致）
+                        note = min(data[pos], 127)
+                        velocity = min(data[pos + 1], 127)
+                        if velocity:
+                            hist[note] += 1
+                            velocity_sum += velocity
+                pos += CHANNEL_DATA_LENGTHS[kind]
+                continue
+
+            channel = 0
+            if status == 0xFF:
+                pos += 1  # meta 类型
+                length, pos = _read_variable_int(data, pos)
+            elif status == 0xF0 or status == 0xF7:
+                length, pos = _read_variable_int(data, pos)
+            elif status in SYSTEM_DATA_LENGTHS:
+                length = SYSTEM_DATA_LENGTHS[status]
+            else:
+                raise OSError(f'undefined status byte 0x{status:02x}')
+
+            if length > MAX_MESSAGE_LENGTH:
+                raise OSError(f'Message length {length} exceeds maximum length {MAX_MESSAGE_LENGTH}')
+            pos += length
+    except IndexError:
+        raise EOFError
+
+    if pos > len(data):
+        raise EOFError
+
+    return {
+        'hist': hist,
+        'velocity_sum': velocity_sum,
+        'has_notes': has_notes,
+        'channel': channel,
+    }
@@ -0,0 +1,115 @@
+"""
+预览合成器 - 安装了 pyfluidsynth 且程序目录下有音色库时，直接按内存中的音符事件合成预览，
+省去写入临时MIDI文件再由 pygame 重新解析的过程。
+"""
+
+import os
+import sys
+import threading
+import time
+import mido
+
+# 预览使用的音色库文件（放在程序所在目录）
+SOUNDFONT_FILE = "default.sf2"
+# 打击乐通道（MIDI 通道10）
+DRUM_CHANNEL = 9
+DRUM_BANK = 128
+
+def get_app_dir():
+    """程序所在目录，打包后为 exe 所在目录"""
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+# 延迟导入 fluidsynth
+def get_fluidsynth():
+    try:
+        import fluidsynth
+        return fluidsynth
+    except ImportError:
+        return None
+
+def create_synth_preview(soundfont=SOUNDFONT_FILE):
+    """创建预览合成器，缺少 fluidsynth 或音色库时返回 None（改用 pygame 预览）"""
+    fluidsynth = get_fluidsynth()
+    soundfont = os.path.join(get_app_dir(), soundfont)
+    if fluidsynth is None or not os.path.exists(soundfont):
+        return None
+    try:
+        return SynthPreview(fluidsynth, soundfont)
+    except Exception as e:
+        print(f"初始化预览合成器失败: {str(e)}")
+        return None
+
+class SynthPreview:
+    def __init__(self, fluidsynth, soundfont):
+        self._synth = fluidsynth.Synth()
+        self._synth.start()
+        sfid = self._synth.sfload(soundfont)
+        for channel in range(16):
+            # 打击乐通道保留鼓组音色，与 pygame 预览一致
+            bank = DRUM_BANK if channel == DRUM_CHANNEL else 0
+            self._synth.program_select(channel, sfid, bank, 0)
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def play(self, preview_mid):
+        """开始预览，音符事件在调用线程中一次性生成"""
+        self.stop()
+
+        # 自行合并音轨并按速度变化把增量 tick 换算成秒，不依赖 MidiFile 缓存的合并音轨（复用的对象会播放旧音符），
+        # 累加后存为整数纳秒，与播放器的计时一致
+        events = []
+        current_time = 0.0
+        tempo = 500000  # 默认速度 120 BPM
+        ticks_per_beat = preview_mid.ticks_per_beat
+        for msg in mido.merge_tracks(preview_mid.tracks):
+            if msg.time:
+                current_time += mido.tick2second(msg.time, ticks_per_beat, tempo)
+            if msg.type == 'set_tempo':
+                tempo = msg.tempo
+            elif msg.type in ('note_on', 'note_off'):
+                events.append((round(current_time * 1_000_000_000), msg))
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._play_events, args=(events,), daemon=True)
+        self._thread.start()
+
+    def _play_events(self, events):
+        """按绝对时间（纳秒）依次发送音符事件"""
+        try:
+            start = time.perf_counter_ns()
+            for event_time, msg in events:
+                delay = start + event_time - time.perf_counter_ns()
+                if delay > 0 and self._stop_event.wait(delay / 1e9):
+                    break
+                if self._stop_event.is_set():
+                    break
+
+                if msg.type == 'note_on':
+                    self._synth.noteon(msg.channel, msg.note, msg.velocity)
+                else:
+                    self._synth.noteoff(msg.channel, msg.note)
+        except Exception as e:
+            print(f"合成预览时出错: {str(e)}")
+        finally:
+            # 关闭所有通道上仍在发声的音符
+            for channel in range(16):
+                self._synth.cc(channel, 123, 0)
+
+    def is_busy(self):
+        """是否正在预览"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def stop(self):
+        """停止预览"""
+        self._stop_event.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def close(self):
+        """释放合成器"""
+        self.stop()
+        self._synth.delete()
@@ -0,0 +1,63 @@
+"""
+前台窗口事件 - 在 Windows 上通过 SetWinEventHook 接收前台窗口切换通知，
+窗口切换时才检查目标窗口，不必定时查询前台窗口和窗口标题。
+"""
+
+import ctypes
+from ctypes import wintypes
+
+EVENT_SYSTEM_FOREGROUND = 0x0003
+WINEVENT_OUTOFCONTEXT = 0x0000
+PM_REMOVE = 0x0001
+QS_ALLINPUT = 0x04FF
+
+def create_foreground_hook(on_foreground):
+    """创建前台窗口切换钩子，不是 Windows 或安装失败时返回 None（改为定时查询）
+
+    钩子的回调通过当前线程的消息队列分发，必须在之后调用 run 的同一线程中创建。
+    """
+    try:
+        user32 = ctypes.windll.user32
+        proc_type = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                       wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+    except (AttributeError, OSError):
+        return None
+    try:
+        return ForegroundHook(user32, proc_type, on_foreground)
+    except Exception as e:
+        print(f"安装前台窗口钩子失败: {str(e)}")
+        return None
+
+class ForegroundHook:
+    def __init__(self, user32, proc_type, on_foreground):
+        self._user32 = user32
+        self._on_foreground = on_foreground
+        self._proc = proc_type(self._handle_event)  # 保持引用，避免回调对象被回收
+        self._msg = wintypes.MSG()
+        # 钩子句柄是指针大小，默认的 int 返回值在 64 位系统上会被截断
+        user32.SetWinEventHook.restype = wintypes.HANDLE
+        user32.UnhookWinEvent.argtypes = [wintypes.HANDLE]
+        self._hook = user32.SetWinEventHook(EVENT_SYSTEM_FOREGROUND, EVENT_SYSTEM_FOREGROUND,
+                                            None, self._proc, 0, 0, WINEVENT_OUTOFCONTEXT)
+        if not self._hook:
+            raise OSError("SetWinEventHook 返回空句柄")
+
+    def _handle_event(self, hook, event, hwnd, id_object, id_child, thread_id, event_time):
+        try:
+            self._on_foreground(hwnd)
+        except Exception as e:
+            print(f"处理前台窗口切换时出错: {str(e)}")
+
+    def run(self, keep_running, timeout):
+        """分发钩子通知直到 keep_running() 返回 False，没有通知时每 timeout 秒醒来检查一次，退出时卸载钩子"""
+        user32 = self._user32
+        msg_ref = ctypes.byref(self._msg)
+        timeout_ms = int(timeout * 1000)
+        try:
+            while keep_running():
+                user32.MsgWaitForMultipleObjects(0, None, False, timeout_ms, QS_ALLINPUT)
+                while user32.PeekMessageW(msg_ref, None, 0, 0, PM_REMOVE):
+                    user32.TranslateMessage(msg_ref)
+                    user32.DispatchMessageW(msg_ref)
+        finally:
+            user32.UnhookWinEvent(self._hook)